@@ -3,6 +3,7 @@ import requests
 import json
 from datetime import datetime, timedelta
 import time
+import uuid
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
@@ -223,6 +224,13 @@ st.markdown("""
 # API endpoint
 API_URL = "http://localhost:8000"
 
+# Page size for the task list
+TODO_PAGE_SIZE = 20
+
+# Generation jobs: long-poll interval and how long a page waits before giving up (seconds)
+JOB_POLL_WAIT = 10
+JOB_TIMEOUT = 180
+
 # Initialize session state
 if "last_update" not in st.session_state:
     st.session_state.last_update = datetime.now()
@@ -230,6 +238,14 @@ if "selected_suggestion" not in st.session_state:
     st.session_state.selected_suggestion = ""
 if "show_quick_task" not in st.session_state:
     st.session_state.show_quick_task = False
+if "todo_cursor" not in st.session_state:
+    st.session_state.todo_cursor = {}
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+if "chat_session" not in st.session_state:
+    st.session_state.chat_session = uuid.uuid4().hex
+if "popular_weather" not in st.session_state:
+    st.session_state.popular_weather = {}
 
 # Mobile installation prompt with install button
 st.markdown("""
@@ -282,6 +298,77 @@ def check_api_status():
     except:
         return False
 
+def stream_events(path, payload, timeout=120):
+    """Yield server-sent events from one of the streaming endpoints"""
+    with requests.post(f"{API_URL}{path}", json=payload, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
+def submit_job(kind, params):
+    """Queue a background generation job and return its id"""
+    response = requests.post(f"{API_URL}/jobs", json={"kind": kind, "params": params}, timeout=10)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def wait_for_job(job_id, timeout=JOB_TIMEOUT):
+    """Long-poll a job until it finishes; returns None if it is still running after timeout"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(
+            f"{API_URL}/jobs/{job_id}",
+            params={"wait": JOB_POLL_WAIT},
+            timeout=JOB_POLL_WAIT + 10
+        )
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+    return None
+
+def follow_job(job_id, on_token, timeout=JOB_TIMEOUT):
+    """Follow a job's event stream, passing partial output to on_token(field, text);
+    returns the finished job, or None if the stream ends first"""
+    with requests.get(f"{API_URL}/jobs/{job_id}/stream", stream=True, timeout=(10, timeout)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("type") == "token":
+                on_token(event["field"], event["text"])
+            elif event.get("status") in ("succeeded", "failed"):
+                return event
+    return None
+
+def finished_job(name, spinner_text, on_token):
+    """Wait on the session's pending job of this name, rendering its output as it streams in;
+    returns the finished job or None"""
+    job_id = st.session_state.jobs.get(name)
+    if not job_id:
+        return None
+    with st.spinner(spinner_text):
+        try:
+            job = follow_job(job_id, on_token)
+        except:
+            job = None
+        if job is None:
+            # Stream dropped: fall back to long-polling; the job keeps running either way
+            try:
+                job = wait_for_job(job_id)
+            except:
+                st.error("Lost contact with the job - it keeps running on the server")
+                return None
+    if job is None:
+        st.info("⏳ Still working in the background. Check back in a moment.")
+        return None
+    del st.session_state.jobs[name]
+    if job["status"] == "failed":
+        st.error(f"Generation failed: {job.get('error')}")
+        return None
+    return job
+
 def get_system_stats():
     """Get comprehensive system statistics"""
     stats = {
@@ -289,28 +376,19 @@ def get_system_stats():
         "total_tasks": 0,
         "completed_tasks": 0,
         "chat_messages": 0,
+        "blogs": 0,
+        "code_snippets": 0,
         "completion_rate": 0
     }
     
     try:
-        # Check API status
-        stats["api_online"] = check_api_status()
-        
-        if stats["api_online"]:
-            # Get tasks stats
-            response = requests.get(f"{API_URL}/todos", timeout=5)
-            if response.status_code == 200:
-                todos = response.json()['todos']
-                stats["total_tasks"] = len(todos)
-                stats["completed_tasks"] = len([t for t in todos if t['completed']])
-                if stats["total_tasks"] > 0:
-                    stats["completion_rate"] = round((stats["completed_tasks"] / stats["total_tasks"]) * 100, 1)
-            
-            # Get chat stats
-            response = requests.get(f"{API_URL}/chat/history", timeout=5)
-            if response.status_code == 200:
-                history = response.json()['history']
-                stats["chat_messages"] = len(history)
+        # One aggregated call; a successful response also means the API is up
+        response = requests.get(f"{API_URL}/stats", timeout=5)
+        if response.status_code == 200:
+            stats.update(response.json())
+            stats["api_online"] = True
+        else:
+            stats["api_online"] = check_api_status()
     except:
         pass
     
@@ -443,16 +521,13 @@ with st.sidebar:
     
     if stats["api_online"]:
         try:
-            # Get recent todos
-            response = requests.get(f"{API_URL}/todos", timeout=5)
+            # Get recent todos (the API returns newest first)
+            response = requests.get(f"{API_URL}/todos", params={"limit": 3}, timeout=5)
             if response.status_code == 200:
                 todos_data = response.json()
-                todos = todos_data.get('todos', [])
+                recent_todos = todos_data.get('todos', [])
                 
-                if todos:
-                    # Sort by created_at and get recent ones
-                    recent_todos = sorted(todos, key=lambda x: x.get('created_at', ''), reverse=True)[:3]
-                    
+                if recent_todos:
                     for todo in recent_todos:
                         status = "✅" if todo.get('completed', False) else "⏳"
                         task_text = todo.get('task', 'Unknown task')
@@ -704,29 +779,77 @@ if stats["api_online"]:
         with col3:
             filter_category = st.selectbox("Filter by Category", ["All", "general", "work", "personal", "health", "finance"])
         
+        col_search, col_sort = st.columns([2, 1])
+        with col_search:
+            search_text = st.text_input("Search tasks", placeholder="Filter by text...")
+        with col_sort:
+            sort_order = st.selectbox("Sort by", ["newest", "oldest", "priority"])
+        
+        # Filtering and sorting happen server-side
+        todo_params = {"sort": sort_order}
+        if filter_status != "All":
+            todo_params["completed"] = filter_status == "Completed"
+        if filter_priority != "All":
+            todo_params["priority"] = filter_priority
+        if filter_category != "All":
+            todo_params["category"] = filter_category
+        if search_text:
+            todo_params["q"] = search_text
+        
+        # Start from the first page whenever the filters change
+        if st.session_state.get("todo_filters") != todo_params:
+            st.session_state.todo_filters = todo_params
+            st.session_state.todo_cursor = {}
+        
         # Display tasks
         try:
-            response = requests.get(f"{API_URL}/todos", timeout=5)
+            response = requests.get(
+                f"{API_URL}/todos",
+                params={"limit": TODO_PAGE_SIZE, **todo_params, **st.session_state.todo_cursor},
+                timeout=5
+            )
             if response.status_code == 200:
-                todos = response.json()['todos']
-                
-                # Apply filters
-                filtered_todos = todos
-                if filter_status != "All":
-                    if filter_status == "Pending":
-                        filtered_todos = [t for t in filtered_todos if not t['completed']]
-                    else:
-                        filtered_todos = [t for t in filtered_todos if t['completed']]
-                
-                if filter_priority != "All":
-                    filtered_todos = [t for t in filtered_todos if t.get('priority') == filter_priority]
-                
-                if filter_category != "All":
-                    filtered_todos = [t for t in filtered_todos if t.get('category') == filter_category]
+                todo_page = response.json()
+                filtered_todos = todo_page['todos']
                 
                 if filtered_todos:
                     st.markdown(f"### 📋 Tasks ({len(filtered_todos)} found)")
                     
+                    # Bulk actions for the tasks on this page
+                    task_labels = {todo['id']: f"#{todo['id']} {todo['task'][:40]}" for todo in filtered_todos}
+                    selected_ids = st.multiselect(
+                        "Select tasks for bulk actions",
+                        options=list(task_labels),
+                        format_func=lambda todo_id: task_labels[todo_id]
+                    )
+                    
+                    if selected_ids:
+                        bulk_col1, bulk_col2, bulk_col3 = st.columns(3)
+                        bulk_payload = None
+                        with bulk_col1:
+                            if st.button("✅ Complete selected", use_container_width=True):
+                                bulk_payload = {"update": [{"id": i, "completed": True} for i in selected_ids]}
+                        with bulk_col2:
+                            if st.button("↩️ Reopen selected", use_container_width=True):
+                                bulk_payload = {"update": [{"id": i, "completed": False} for i in selected_ids]}
+                        with bulk_col3:
+                            if st.button("🗑️ Delete selected", use_container_width=True):
+                                bulk_payload = {"delete": selected_ids}
+                        
+                        if bulk_payload:
+                            try:
+                                response = requests.post(f"{API_URL}/todos/bulk", json=bulk_payload, timeout=10)
+                                if response.status_code == 200:
+                                    results = response.json()
+                                    changed = [r for r in results['updated'] + results['deleted'] if r['status'] != "not_found"]
+                                    st.success(f"✅ {len(changed)} task(s) updated!")
+                                    time.sleep(1)
+                                    st.rerun()
+                                else:
+                                    st.error("Bulk update failed")
+                            except:
+                                st.error("Bulk update failed")
+                    
                     for todo in filtered_todos:
                         priority_colors = {"high": "🔴", "medium": "🟡", "low": "🟢"}
                         priority_emoji = priority_colors.get(todo.get('priority', 'medium'), '🟡')
@@ -784,6 +907,17 @@ if stats["api_online"]:
                                         st.error("Delete failed")
                 else:
                     st.info("📝 No tasks match your filters. Try adjusting the filter criteria or add a new task!")
+                
+                # Page navigation
+                nav_newer, nav_older = st.columns(2)
+                with nav_newer:
+                    if todo_page.get('prev_cursor') and st.button("⬅️ Newer tasks", use_container_width=True):
+                        st.session_state.todo_cursor = {"after": todo_page['prev_cursor']}
+                        st.rerun()
+                with nav_older:
+                    if todo_page.get('next_cursor') and st.button("Older tasks ➡️", use_container_width=True):
+                        st.session_state.todo_cursor = {"before": todo_page['next_cursor']}
+                        st.rerun()
         except:
             st.error("Connection error")
     
@@ -791,16 +925,25 @@ if stats["api_online"]:
     with tabs[2]:
         st.header("💬 AI Assistant (Gemini 2.0 Flash)")
         
+        # The assistant remembers this conversation until a new one is started
+        if st.button("🆕 New conversation", key="new_chat_session"):
+            st.session_state.chat_session = uuid.uuid4().hex
+            st.rerun()
+        
         # Display chat history
         try:
-            response = requests.get(f"{API_URL}/chat/history", timeout=5)
+            response = requests.get(
+                f"{API_URL}/chat/history",
+                params={"limit": 10, "session_id": st.session_state.chat_session},
+                timeout=5
+            )
             if response.status_code == 200:
                 history = response.json()['history']
                 
                 if history:
                     st.markdown("### 💭 Conversation History")
                     
-                    for chat in history[-10:]:  # Last 10 messages
+                    for chat in history:  # Last 10 messages
                         # User message
                         st.markdown(f"""
                         <div class="chat-message user-message">
@@ -862,19 +1005,31 @@ if stats["api_online"]:
             # Clear the suggestion after sending
             st.session_state.selected_suggestion = ""
             
-            with st.spinner("🤖 AI is thinking with Gemini 2.0 Flash..."):
-                try:
-                    response = requests.post(
-                        f"{API_URL}/chat",
-                        json={"message": user_message},
-                        timeout=30
-                    )
-                    if response.status_code == 200:
+            # Render the reply as it streams in
+            reply_placeholder = st.empty()
+            reply = ""
+            try:
+                for event in stream_events(
+                    "/chat/stream",
+                    {"message": user_message, "session_id": st.session_state.chat_session},
+                    timeout=30
+                ):
+                    if event["type"] == "token":
+                        reply += event["text"]
+                        reply_placeholder.markdown(f"""
+                        <div class="chat-message bot-message">
+                            <strong>🤖 AI Assistant:</strong><br>
+                            {reply}
+                        </div>
+                        """, unsafe_allow_html=True)
+                    elif event["type"] == "error":
+                        st.warning(event["detail"])
+                    elif event["type"] == "done":
                         st.success("✅ Message sent!")
                         time.sleep(1)
                         st.rerun()
-                except:
-                    st.error("Click on sent button again")
+            except:
+                st.error("Click on sent button again")
     
     # Content Creator Tab
     with tabs[3]:
@@ -897,45 +1052,59 @@ if stats["api_online"]:
                 submitted = st.form_submit_button("✍️ Generate Content", type="primary", use_container_width=True)
                 
                 if submitted and topic:
-                    with st.spinner("✍️ Creating content with Gemini 2.0 Flash..."):
-                        try:
-                            response = requests.post(
-                                f"{API_URL}/generate/blog",
-                                json={
-                                    "topic": topic,
-                                    "length": length,
-                                    "style": style
-                                },
-                                timeout=60
-                            )
-                            if response.status_code == 200:
-                                content_data = response.json()
-                                st.success("✅ Content generated!")
-                                
-                                # Display generated content
-                                st.markdown("### 📄 Generated Content")
-                                st.markdown(content_data.get("content", "Content generation failed"))
-                                
-                                # Content stats
-                                word_count = content_data.get("word_count", 0)
-                                st.info(f"📊 Word count: {word_count} | Style: {style} | Length: {length}")
-                        except:
-                            st.error("Content generation failed")
+                    # Generation runs as a server-side job so slow models can't time out the page
+                    try:
+                        st.session_state.jobs["blog"] = submit_job(
+                            "blog", {"topic": topic, "length": length, "style": style}
+                        )
+                    except:
+                        st.error("Content generation failed")
+            
+            if st.session_state.jobs.get("blog"):
+                st.markdown("### 📄 Generated Content")
+                content_placeholder = st.empty()
+                streamed = {"content": ""}
+                
+                def show_content(field, text):
+                    streamed[field] = streamed.get(field, "") + text
+                    content_placeholder.markdown(streamed["content"])
+                
+                job = finished_job("blog", "✍️ Generating content...", show_content)
+            else:
+                job = None
+            if job:
+                result = job["result"]
+                content_placeholder.markdown(result["content"])
+                if result.get("note"):
+                    st.warning(result["note"])
+                else:
+                    st.success("✅ Content generated!")
+                
+                # Content stats
+                st.info(f"📊 Word count: {result.get('word_count', 0)} | Style: {result['style']} | Length: {result['length']}")
         
         with col2:
             st.subheader("📚 Recent Content")
             
             try:
-                response = requests.get(f"{API_URL}/blogs", timeout=5)
+                response = requests.get(f"{API_URL}/blogs", params={"limit": 3, "fields": "summary"}, timeout=5)
                 if response.status_code == 200:
                     blogs = response.json()['blogs']
                     
                     if blogs:
-                        for blog in blogs[:3]:
+                        for blog in blogs:
                             with st.expander(f"📄 {blog['topic'][:30]}..."):
                                 st.markdown(f"**Topic:** {blog['topic']}")
                                 st.markdown(f"**Created:** {blog['created_at']}")
                                 st.markdown(f"**Words:** {blog.get('word_count', 'N/A')}")
+                                
+                                # Full body is only fetched on demand
+                                if st.button("📖 Read full post", key=f"blog_{blog['id']}"):
+                                    full = requests.get(f"{API_URL}/blogs/{blog['id']}", timeout=5)
+                                    if full.status_code == 200:
+                                        st.markdown(full.json()['content'])
+                                elif blog.get('preview'):
+                                    st.caption(blog['preview'])
                     else:
                         st.info("📝 No content yet. Generate your first blog post!")
             except:
@@ -959,45 +1128,68 @@ if stats["api_online"]:
                 submitted = st.form_submit_button("💻 Generate Code", type="primary", use_container_width=True)
                 
                 if submitted and description:
-                    with st.spinner("💻 Generating code with Gemini 2.0 Flash..."):
+                    # Generation runs as a server-side job so slow models can't time out the page
+                    try:
+                        st.session_state.jobs["code"] = submit_job(
+                            "code", {"description": description, "language": language}
+                        )
+                    except:
+                        st.error("Code generation failed")
+            
+            if st.session_state.jobs.get("code"):
+                st.markdown("### 💻 Generated Code")
+                code_placeholder = st.empty()
+                streamed = {"code": ""}
+                
+                def show_code(field, text):
+                    streamed[field] = streamed.get(field, "") + text
+                    if field == "code":
+                        code_placeholder.code(streamed["code"], language=language)
+                
+                job = finished_job("code", "💻 Generating code...", show_code)
+            else:
+                job = None
+            if job:
+                result = job["result"]
+                code_placeholder.code(result["code"], language=result["language"])
+                if result.get("note"):
+                    st.warning(result["note"])
+                else:
+                    st.success("✅ Code generated!")
+                
+                # The explanation is a separate call so the code shows up first
+                st.markdown("### 📖 Code Explanation")
+                if result.get("explanation"):
+                    st.markdown(result["explanation"])
+                elif result.get("id"):
+                    with st.spinner("Explaining the code..."):
                         try:
-                            response = requests.post(
-                                f"{API_URL}/code/generate",
-                                json={
-                                    "description": description,
-                                    "language": language
-                                },
-                                timeout=60
-                            )
+                            response = requests.get(f"{API_URL}/code/snippets/{result['id']}/explanation", timeout=60)
                             if response.status_code == 200:
-                                code_data = response.json()
-                                st.success("✅ Code generated!")
-                                
-                                # Display generated code
-                                st.markdown("### 💻 Generated Code")
-                                st.code(code_data.get("code", "Code generation failed"), language=language)
-                                
-                                # Code explanation
-                                if "explanation" in code_data:
-                                    st.markdown("### 📖 Code Explanation")
-                                    st.markdown(code_data["explanation"])
+                                st.markdown(response.json()["explanation"])
                         except:
-                            st.error("Code generation failed")
+                            st.warning("Explanation is not available right now")
         
         with col2:
             st.subheader("📚 Code Snippets")
             
             try:
-                response = requests.get(f"{API_URL}/code/snippets", timeout=5)
+                response = requests.get(f"{API_URL}/code/snippets", params={"limit": 3, "fields": "summary"}, timeout=5)
                 if response.status_code == 200:
                     snippets = response.json()['snippets']
                     
                     if snippets:
-                        for snippet in snippets[:3]:
+                        for snippet in snippets:
                             with st.expander(f"💻 {snippet['title'][:30]}..."):
                                 st.markdown(f"**Language:** {snippet['language']}")
                                 st.markdown(f"**Created:** {snippet['created_at']}")
-                                st.code(snippet['code'][:200] + "...", language=snippet['language'])
+                                
+                                if st.button("📄 Show full code", key=f"snippet_{snippet['id']}"):
+                                    full = requests.get(f"{API_URL}/code/snippets/{snippet['id']}", timeout=5)
+                                    if full.status_code == 200:
+                                        st.code(full.json()['code'], language=snippet['language'])
+                                else:
+                                    st.code(snippet.get('preview') or "", language=snippet['language'])
                     else:
                         st.info("💻 No code snippets yet. Generate your first code!")
             except:
@@ -1039,6 +1231,9 @@ if stats["api_online"]:
                                             st.info(weather["message"])
                                     else:
                                         st.success(f"🌍 Weather for {weather['location']}")
+                                        cache = weather.get("cache") or {}
+                                        if cache.get("hit"):
+                                            st.caption(f"🕒 Cached data from {round(cache['age_seconds'] / 60)} min ago")
                                         
                                         # Enhanced weather display
                                         st.markdown(f"""
@@ -1155,22 +1350,33 @@ if stats["api_online"]:
                 {"name": "Toronto", "flag": "🇨🇦"}
             ]
             
+            if st.button("🌍 Get weather for all", key="popular_refresh", use_container_width=True):
+                # One batch request for the whole panel instead of one per city
+                with st.spinner("🌤️ Getting weather for popular locations..."):
+                    try:
+                        response = requests.post(
+                            f"{API_URL}/weather/batch",
+                            json={"locations": [city['name'] for city in popular_cities]},
+                            timeout=30
+                        )
+                        if response.status_code == 200:
+                            st.session_state.popular_weather = {
+                                result['query']: result for result in response.json()['results']
+                            }
+                        else:
+                            st.error("Weather service unavailable")
+                    except:
+                        st.error("Failed to get weather for popular locations")
+            
             for city in popular_cities:
-                if st.button(f"{city['flag']} {city['name']}", key=f"city_{city['name']}", use_container_width=True):
-                    # Trigger weather fetch for selected city
-                    with st.spinner(f"🌤️ Getting weather for {city['name']}..."):
-                        try:
-                            response = requests.post(
-                                f"{API_URL}/weather",
-                                json={"location": city['name']},
-                                timeout=15
-                            )
-                            if response.status_code == 200:
-                                weather = response.json()
-                                if "error" not in weather:
-                                    st.success(f"🌍 {weather['location']}: {weather['temperature']}°C, {weather['description']}")
-                        except:
-                            st.error(f"Failed to get weather for {city['name']}")
+                weather = st.session_state.popular_weather.get(city['name'])
+                if weather is None:
+                    st.markdown(f"{city['flag']} **{city['name']}**")
+                elif "error" in weather:
+                    st.markdown(f"{city['flag']} **{city['name']}**: {weather['error']}")
+                else:
+                    st.markdown(f"{city['flag']} **{city['name']}**: {weather.get('icon', '🌤️')} "
+                                f"{weather['temperature']}°C, {weather['description']}")
             
             st.markdown("---")
             
@@ -1215,7 +1421,7 @@ if stats["api_online"]:
             
             feature_usage = {
                 'Feature': ['Task Manager', 'AI Chat', 'Content Creator', 'Code Generator', 'Weather Center'],
-                'Usage': [stats['total_tasks'], stats['chat_messages'], 2, 1, 5]
+                'Usage': [stats['total_tasks'], stats['chat_messages'], stats['blogs'], stats['code_snippets'], 5]
             }
             
             fig = px.bar(
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Response cache sizing: in-memory LRU entries and persistent TTL (seconds)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def make_key(agent, model, **params):
+    """Stable hash of (agent, model, normalized prompt parameters)"""
+    payload = {
+        "agent": agent,
+        "model": model,
+        "params": {name: _normalize(value) for name, value in params.items()},
+    }
+    raw = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Model responses cached in an in-memory LRU in front of the llm_cache table"""
+
+    def __init__(self, db, write_queue, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL):
+        self.db = db
+        self.write_queue = write_queue
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, value); only touched from the event loop
+        self._memory = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def get(self, key):
+        """Cached value for key, or None on a miss or expiry"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+
+        try:
+            row = await self.db.fetch_one(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            )
+        except Exception as e:
+            logger.error(f"Response cache lookup failed: {e}")
+            row = None
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+
+        value = json.loads(row["response"])
+        self._remember(key, row["expires_at"], value)
+        self._stats["persistent_hits"] += 1
+        return value
+
+    async def set(self, key, agent, value):
+        """Store a value in both tiers; the SQLite write goes through the write-behind queue"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+        self._stats["stores"] += 1
+        await self.write_queue.submit(
+            "INSERT OR REPLACE INTO llm_cache (key, agent, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, agent, json.dumps(value), time.time(), expires_at)
+        )
+
+    def record_bypass(self):
+        self._stats["bypassed"] += 1
+
+    async def purge_expired(self):
+        """Drop expired rows from the persistent tier"""
+        return await self.db.write(
+            lambda conn: conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        )
+
+    def stats(self):
+        """Hit/miss counters for both tiers"""
+        snapshot = dict(self._stats)
+        lookups = snapshot["memory_hits"] + snapshot["persistent_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round((lookups - snapshot["misses"]) / lookups * 100, 1) if lookups else 0
+        snapshot["memory_entries"] = len(self._memory)
+        snapshot["max_entries"] = self.max_entries
+        snapshot["ttl_seconds"] = self.ttl
+        return snapshot
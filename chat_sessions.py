@@ -0,0 +1,193 @@
+import os
+import asyncio
+import logging
+
+import llm
+import prompts
+from utils import estimate_tokens, truncate_text
+
+logger = logging.getLogger(__name__)
+
+# Prompt context per chat request: at most this many recent turns within the token
+# budget, plus a rolling summary of older turns capped at CHAT_SUMMARY_TOKENS
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "6"))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+# Older turns are folded into the summary once this many have left the window
+CHAT_FOLD_BATCH = int(os.getenv("CHAT_FOLD_BATCH", "3"))
+
+
+class ChatSessions:
+    """Bounded per-session chat context: recent turns plus a rolling summary"""
+
+    def __init__(self, db, max_turns=CHAT_CONTEXT_TURNS, token_budget=CHAT_CONTEXT_TOKENS,
+                 summary_tokens=CHAT_SUMMARY_TOKENS, fold_batch=CHAT_FOLD_BATCH):
+        self.db = db
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.fold_batch = fold_batch
+        # Sessions with a summary update running, and the tasks doing it
+        self._folding = set()
+        self._tasks = set()
+        self._stats = {
+            "prompts": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_max": 0,
+            "folds": 0,
+            "folded_turns": 0,
+            "fold_failures": 0,
+        }
+
+    async def _load(self, session_id):
+        summary = await self.db.fetch_one(
+            "SELECT summary, summarized_through FROM chat_summaries WHERE session_id = ?",
+            (session_id,)
+        )
+        summarized_through = summary["summarized_through"] if summary else 0
+        # Only the newest unsummarized turns are read, so the query is bounded too
+        rows = await self.db.fetch_all(
+            """
+            SELECT id, user_message, bot_response FROM chat_history
+            WHERE session_id = ? AND id > ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+            """,
+            (session_id, summarized_through, self.max_turns + self.fold_batch)
+        )
+        return (summary["summary"] if summary else None), summarized_through, rows
+
+    def _split(self, rows):
+        """Split newest-first rows into (window, older), both oldest-first"""
+        window, used = [], 0
+        for row in rows:
+            if len(window) >= self.max_turns:
+                break
+            cost = estimate_tokens(row["user_message"]) + estimate_tokens(row["bot_response"])
+            if window and used + cost > self.token_budget:
+                break
+            if cost > self.token_budget:
+                # A single oversized turn is shortened rather than dropped
+                chars = self.token_budget * 2
+                row = dict(row, user_message=truncate_text(row["user_message"], chars),
+                           bot_response=truncate_text(row["bot_response"], chars))
+                cost = self.token_budget
+            window.append(row)
+            used += cost
+        older = rows[len(window):]
+        return window[::-1], older[::-1]
+
+    async def prompt(self, session_id, message):
+        """Chat prompt for message with this session's context; returns (prompt, context info)"""
+        summary, _, rows = await self._load(session_id)
+        window, older = self._split(rows)
+        prompt = prompts.chat_prompt(message, summary=summary, turns=window)
+
+        tokens = estimate_tokens(prompt)
+        self._stats["prompts"] += 1
+        self._stats["prompt_tokens_total"] += tokens
+        self._stats["prompt_tokens_max"] = max(self._stats["prompt_tokens_max"], tokens)
+        # The reply about to be saved pushes one more turn out of the window
+        pending_fold = len(older) + (1 if len(window) >= self.max_turns else 0)
+        return prompt, {
+            "turns": len(window),
+            "summarized": summary is not None,
+            "prompt_tokens": tokens,
+            "fold_due": pending_fold >= self.fold_batch,
+        }
+
+    def schedule_fold(self, session_id, model, after=None):
+        """Fold turns that left the window into the summary, off the request path
+
+        after is an awaitable (the queued insert of the latest turn) to wait for first.
+        """
+        if session_id in self._folding:
+            return
+        self._folding.add(session_id)
+        task = asyncio.create_task(self._fold(session_id, model, after))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, session_id, model, after):
+        try:
+            if after is not None:
+                await after
+            summary, summarized_through, rows = await self._load(session_id)
+            window, _ = self._split(rows)
+            if not window:
+                return
+            # Oldest unsummarized turns outside the window, so a failed or skipped fold
+            # leaves nothing behind: summarized_through only passes turns folded here
+            older = await self.db.fetch_all(
+                """
+                SELECT id, user_message, bot_response FROM chat_history
+                WHERE session_id = ? AND id > ? AND id < ?
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (session_id, summarized_through, min(row["id"] for row in window), self.fold_batch)
+            )
+            if not older:
+                return
+            response = await llm.generate_content(
+                model, prompts.summary_prompt(summary, older, self.summary_tokens * 3 // 4),
+                agent="chat_summary"
+            )
+            new_summary = truncate_text(response.strip(), self.summary_tokens * 4)
+            await self.db.execute(
+                """
+                INSERT INTO chat_summaries (session_id, summary, summarized_through, turns, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    summarized_through = excluded.summarized_through,
+                    turns = chat_summaries.turns + excluded.turns,
+                    updated_at = excluded.updated_at
+                WHERE excluded.summarized_through > chat_summaries.summarized_through
+                """,
+                (session_id, new_summary, older[-1]["id"], len(older))
+            )
+            self._stats["folds"] += 1
+            self._stats["folded_turns"] += len(older)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The turns stay unsummarized and are retried on the next fold
+            self._stats["fold_failures"] += 1
+            logger.error(f"Chat summary update for session {session_id} failed: {e}")
+        finally:
+            self._folding.discard(session_id)
+
+    async def session(self, session_id):
+        """Stored summary and turn counts for a session"""
+        summary = await self.db.fetch_one(
+            "SELECT summary, summarized_through, turns, updated_at FROM chat_summaries WHERE session_id = ?",
+            (session_id,)
+        )
+        count = await self.db.fetch_one(
+            "SELECT COUNT(*) AS turns FROM chat_history WHERE session_id = ?", (session_id,)
+        )
+        return {
+            "session_id": session_id,
+            "turns": count["turns"],
+            "summarized_turns": summary["turns"] if summary else 0,
+            "summary": summary["summary"] if summary else None,
+            "summary_updated_at": summary["updated_at"] if summary else None,
+        }
+
+    async def stop(self):
+        """Cancel summary updates still running (their turns are folded next time)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        """Prompt size and summary fold counters"""
+        snapshot = dict(self._stats)
+        prompts_built = snapshot["prompts"]
+        snapshot["prompt_tokens_avg"] = round(snapshot["prompt_tokens_total"] / prompts_built, 1) if prompts_built else 0
+        snapshot["folds_running"] = len(self._folding)
+        snapshot["max_turns"] = self.max_turns
+        snapshot["token_budget"] = self.token_budget
+        snapshot["summary_tokens"] = self.summary_tokens
+        return snapshot
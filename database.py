@@ -1,54 +1,324 @@
 import sqlite3
 import os
+import json
+import time
+import base64
+import queue
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DATABASE_PATH", "agent_system.db")
+
+# Per-connection pragmas applied to every pooled connection
+DEFAULT_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -20000,        # ~20 MB page cache
+    "mmap_size": 268435456,      # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+}
+
+
+def encode_cursor(values):
+    """Opaque page token for a row's sort-key values (id last)"""
+    raw = json.dumps(list(values))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    """Inverse of encode_cursor; raises ValueError on malformed tokens"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        return values[:-1] + [int(values[-1])]
+    except Exception:
+        raise ValueError(f"Invalid cursor: {token}")
+
+
+def _is_locked_error(error):
+    """Check whether an OperationalError is a transient lock/busy error"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: one serialized writer and a pool of readers"""
+
+    def __init__(self, db_path=DB_PATH, readers=4, busy_timeout=5000,
+                 max_retries=3, retry_delay=0.05, pragmas=None):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+
+        self._writer = self._connect()
+        self.journal_mode = self._writer.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        self._writer_lock = threading.Lock()
+
+        self._readers = queue.LifoQueue()
+        self._reader_count = readers
+        for _ in range(readers):
+            self._readers.put(self._connect(read_only=True))
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "reads": 0,
+            "writes": 0,
+            "retries": 0,
+            "errors": 0,
+            "reader_wait_ms": 0.0,
+            "writer_wait_ms": 0.0,
+            "max_reader_wait_ms": 0.0,
+            "max_writer_wait_ms": 0.0,
+        }
+        self._closed = False
+        self.created_at = datetime.now()
+
+    def _connect(self, read_only=False):
+        """Open a connection and apply the configured pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _record(self, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _record_wait(self, kind, waited_ms):
+        with self._stats_lock:
+            self._stats[f"{kind}_wait_ms"] += waited_ms
+            if waited_ms > self._stats[f"max_{kind}_wait_ms"]:
+                self._stats[f"max_{kind}_wait_ms"] = waited_ms
+
+    def _with_retry(self, operation):
+        """Run an operation, retrying transient lock errors with backoff"""
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if not _is_locked_error(e) or attempt >= self.max_retries:
+                    self._record(errors=1)
+                    raise
+                attempt += 1
+                self._record(retries=1)
+                logger.warning(f"Database busy, retrying ({attempt}/{self.max_retries}): {e}")
+                time.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        started = time.perf_counter()
+        conn = self._readers.get()
+        self._record_wait("reader", (time.perf_counter() - started) * 1000)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Hold the writer connection for a single transaction"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        started = time.perf_counter()
+        with self._writer_lock:
+            self._record_wait("writer", (time.perf_counter() - started) * 1000)
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def read(self, fn):
+        """Call fn(conn) on a reader connection"""
+        def operation():
+            with self.reader() as conn:
+                return fn(conn)
+        result = self._with_retry(operation)
+        self._record(reads=1)
+        return result
+
+    def write(self, fn):
+        """Call fn(conn) inside a write transaction and commit it"""
+        def operation():
+            with self.writer() as conn:
+                return fn(conn)
+        result = self._with_retry(operation)
+        self._record(writes=1)
+        return result
+
+    def fetch_all(self, query, params=()):
+        """Run a SELECT and return all rows as dicts"""
+        return self.read(lambda conn: [dict(row) for row in conn.execute(query, params).fetchall()])
+
+    def fetch_one(self, query, params=()):
+        """Run a SELECT and return the first row as a dict (or None)"""
+        def operation(conn):
+            row = conn.execute(query, params).fetchone()
+            return dict(row) if row else None
+        return self.read(operation)
+
+    def execute(self, query, params=()):
+        """Run a single write statement and return the cursor's lastrowid"""
+        return self.write(lambda conn: conn.execute(query, params).lastrowid)
+
+    def fetch_page(self, table, order_by, limit, before=None, after=None,
+                   columns="*", where=None, params=(), descending=True):
+        """Keyset-paginate a table on (*order_by, id)
+
+        order_by is a column or SQL expression (or a list of them). 'before'
+        continues past the cursor in listing order, 'after' goes back
+        towards the start; with the default newest-first order these match
+        their time-based meaning.
+        """
+        if before and after:
+            raise ValueError("Use either 'before' or 'after', not both")
+
+        keys = [order_by] if isinstance(order_by, str) else list(order_by)
+        key_row = "(" + ", ".join(keys + ["id"]) + ")"
+        key_select = ", ".join(f"{expr} AS _key{i}" for i, expr in enumerate(keys))
+        placeholders = "(" + ", ".join("?" * (len(keys) + 1)) + ")"
+
+        clauses = [f"({where})"] if where else []
+        args = list(params)
+        forwards = not after
+        if before:
+            clauses.append(f"{key_row} {'<' if descending else '>'} {placeholders}")
+            args.extend(decode_cursor(before, len(keys) + 1))
+        elif after:
+            # Walk back from the cursor, then flip into listing order
+            clauses.append(f"{key_row} {'>' if descending else '<'} {placeholders}")
+            args.extend(decode_cursor(after, len(keys) + 1))
+
+        direction = "DESC" if descending == forwards else "ASC"
+        query = f"SELECT {columns}, {key_select} FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY " + ", ".join(f"{expr} {direction}" for expr in keys + ["id"]) + " LIMIT ?"
+        args.append(limit + 1)
+
+        rows = self.fetch_all(query, args)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not forwards:
+            rows.reverse()
+
+        cursors = [encode_cursor([row.pop(f"_key{i}") for i in range(len(keys))] + [row["id"]]) for row in rows]
+        more_ahead = has_more if forwards else bool(rows)
+        more_behind = bool(before) if forwards else has_more
+        return {
+            "items": rows,
+            "next_cursor": cursors[-1] if rows and more_ahead else None,
+            "prev_cursor": cursors[0] if rows and more_behind else None,
+        }
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot.update({
+            "db_path": self.db_path,
+            "journal_mode": self.journal_mode,
+            "readers_total": self._reader_count,
+            "readers_available": self._readers.qsize(),
+            "writer_busy": self._writer_lock.locked(),
+            "pragmas": self.pragmas,
+            "busy_timeout_ms": self.busy_timeout,
+            "created_at": self.created_at.isoformat(),
+        })
+        return snapshot
+
+    def close(self):
+        """Close every pooled connection"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._writer_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+class AsyncDatabase:
+    """Awaitable facade over a ConnectionPool, run on a dedicated thread pool"""
+
+    def __init__(self, pool, max_workers=5):
+        self.pool = pool
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite")
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def read(self, fn):
+        """Await fn(conn) on a reader connection"""
+        return await self._run(self.pool.read, fn)
+
+    async def write(self, fn):
+        """Await fn(conn) inside a write transaction"""
+        return await self._run(self.pool.write, fn)
+
+    async def fetch_all(self, query, params=()):
+        """Await a SELECT and return all rows as dicts"""
+        return await self._run(self.pool.fetch_all, query, params)
+
+    async def fetch_one(self, query, params=()):
+        """Await a SELECT and return the first row as a dict (or None)"""
+        return await self._run(self.pool.fetch_one, query, params)
+
+    async def execute(self, query, params=()):
+        """Await a single write statement and return its lastrowid"""
+        return await self._run(self.pool.execute, query, params)
+
+    async def fetch_page(self, table, order_by, limit, **kwargs):
+        """Await a keyset-paginated page (see ConnectionPool.fetch_page)"""
+        return await self._run(functools.partial(self.pool.fetch_page, table, order_by, limit, **kwargs))
+
+    def stats(self):
+        """Pool counters plus executor size"""
+        return dict(self.pool.stats(), executor_threads=self.max_workers)
+
+    def close(self):
+        """Drain the executor, then close the pool"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+
 class Database:
-    def __init__(self, db_path="agent_system.db"):
+    def __init__(self, db_path=DB_PATH):
         self.db_path = db_path
         self.initialize()
     
     def initialize(self):
-        """Initialize database with required tables"""
+        """Bring the database schema up to date"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Create tables
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS todos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task TEXT NOT NULL,
-            completed BOOLEAN NOT NULL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT NOT NULL,
-            reminder_time TIMESTAMP NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS task_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS blog_content (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic TEXT NOT NULL,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        conn.commit()
+        migrate(conn)
         conn.close()
     
     def get_connection(self):
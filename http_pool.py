@@ -0,0 +1,84 @@
+import os
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Shared outbound connection pool: total and idle keep-alive connections, idle expiry (s)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Concurrent requests allowed to any single host
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+# Timeouts (s): connect, read, and waiting for a free pooled connection
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+
+
+def create_client():
+    """Keep-alive httpx client with pool limits and per-phase timeouts"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_READ_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+class PooledClient:
+    """Shared async client that also caps concurrent requests per host"""
+
+    def __init__(self, client=None, max_per_host=HTTP_MAX_PER_HOST):
+        self.client = client if client is not None else create_client()
+        self.max_per_host = max_per_host
+        self._hosts = {}
+        self._stats = {}
+
+    def _host(self, url):
+        host = urlsplit(str(url)).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+            self._stats[host] = {"requests": 0, "errors": 0, "in_flight": 0, "waited": 0}
+        return host
+
+    async def request(self, method, url, **kwargs):
+        host = self._host(url)
+        semaphore, stats = self._hosts[host], self._stats[host]
+        if semaphore.locked():
+            stats["waited"] += 1
+        async with semaphore:
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            try:
+                return await self.client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self):
+        """Per-host request counters and the pool configuration"""
+        return {
+            "hosts": {host: dict(stats) for host, stats in self._stats.items()},
+            "max_per_host": self.max_per_host,
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive": HTTP_MAX_KEEPALIVE,
+        }
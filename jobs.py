@@ -0,0 +1,243 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs run at once, and how long finished jobs are kept (hours)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+_STOP = object()
+
+
+def _decode(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    """Generation jobs persisted in the jobs table and run by a pool of async workers"""
+
+    def __init__(self, db, handlers, workers=JOB_WORKERS, retention_hours=JOB_RETENTION_HOURS):
+        self.db = db
+        # kind -> async callable(params, progress) returning a JSON-serializable result;
+        # progress(field, text) relays partial output to anyone watching the job
+        self.handlers = handlers
+        self.workers = workers
+        self.retention_hours = retention_hours
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._running = set()
+        # job id -> events set whenever that job changes state or reports progress
+        self._watchers = {}
+        # job id -> status changes seen while watched, so watchers skip re-reading on tokens
+        self._changes = {}
+        # running job id -> (field, text) chunks reported so far; kept in memory only
+        self._progress = {}
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "recovered": 0, "worker_errors": 0}
+
+    async def start(self):
+        """Requeue unfinished jobs from a previous run and start the workers"""
+        def recover(conn):
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < datetime('now', ?)",
+                (f"-{self.retention_hours} hours",)
+            )
+            # Jobs that were running when the process died start over
+            conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid"
+            )]
+
+        pending = await self.db.write(recover)
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        self._stats["recovered"] = len(pending)
+        if pending:
+            logger.info(f"Requeued {len(pending)} unfinished jobs")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs still running are picked up again on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind, params):
+        """Persist a new job and queue it; returns the stored job"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        await self.db.execute(
+            "INSERT INTO jobs (id, kind, params, status) VALUES (?, ?, ?, 'queued')",
+            (job_id, kind, json.dumps(params))
+        )
+        self._stats["submitted"] += 1
+        await self._queue.put(job_id)
+        return await self.get(job_id)
+
+    async def get(self, job_id):
+        """Stored job with decoded params and result, or None"""
+        return _decode(await self.db.fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,)))
+
+    async def wait(self, job_id, timeout):
+        """Return the job once it finishes, or its current state after timeout seconds"""
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        try:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return job
+            try:
+                await asyncio.wait_for(self._until_finished(job_id, event), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.get(job_id)
+        finally:
+            self._unwatch(job_id, event)
+
+    async def watch(self, job_id):
+        """Yield the job each time its status changes, ending once it finishes
+
+        Partial output is yielded in between as {"type": "token", "field", "text"} events,
+        replayed from the start for late watchers. The finished job carries the full result.
+        """
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        try:
+            last_status = None
+            seen_changes = None
+            sent = 0
+            while True:
+                changes = self._changes.get(job_id, 0)
+                if changes != seen_changes:
+                    seen_changes = changes
+                    job = await self.get(job_id)
+                    if job is None:
+                        return
+                    if job["status"] != last_status:
+                        last_status = job["status"]
+                        yield job
+                    if job["status"] in FINISHED_STATUSES:
+                        return
+                chunks = self._progress.get(job_id, ())
+                for field, text in chunks[sent:]:
+                    yield {"type": "token", "field": field, "text": text}
+                sent = max(sent, len(chunks))
+                if self._changes.get(job_id, 0) == seen_changes:
+                    await event.wait()
+                    event.clear()
+        finally:
+            self._unwatch(job_id, event)
+
+    async def _until_finished(self, job_id, event):
+        while True:
+            await event.wait()
+            event.clear()
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return
+
+    def _unwatch(self, job_id, event):
+        watchers = self._watchers.get(job_id)
+        if watchers is not None:
+            watchers.discard(event)
+            if not watchers:
+                del self._watchers[job_id]
+                self._changes.pop(job_id, None)
+
+    def _notify(self, job_id):
+        if job_id in self._watchers:
+            self._changes[job_id] = self._changes.get(job_id, 0) + 1
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    def _report(self, job_id, field, text):
+        chunks = self._progress.get(job_id)
+        if chunks is not None:
+            chunks.append((field, text))
+            for event in self._watchers.get(job_id, ()):
+                event.set()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._running.add(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Reading or updating the job failed (e.g. a locked database); the worker carries on
+                self._stats["worker_errors"] += 1
+                logger.error(f"Job {job_id} could not be run: {e}")
+                await self._fail(job_id, f"Job bookkeeping failed: {e}")
+            finally:
+                self._running.discard(job_id)
+                self._progress.pop(job_id, None)
+
+    async def _fail(self, job_id, error):
+        try:
+            await self.db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (error, job_id)
+            )
+            self._stats["failed"] += 1
+        except Exception as e:
+            # Still queued or running in the table, so the next start() requeues it
+            logger.error(f"Job {job_id} could not be marked failed: {e}")
+        self._notify(job_id)
+
+    async def _run(self, job_id):
+        job = await self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        await self.db.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (job_id,)
+        )
+        self._progress[job_id] = []
+        self._notify(job_id)
+
+        try:
+            result = await self.handlers[job["kind"]](
+                job["params"], lambda field, text: self._report(job_id, field, text)
+            )
+        except asyncio.CancelledError:
+            # Shutting down: leave the job 'running' so start() requeues it
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            await self.db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (str(e) or type(e).__name__, job_id)
+            )
+            self._stats["failed"] += 1
+        else:
+            await self.db.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (json.dumps(result), job_id)
+            )
+            self._stats["succeeded"] += 1
+        self._progress.pop(job_id, None)
+        self._notify(job_id)
+
+    def stats(self):
+        """Worker pool size, queue depth and job outcome counters"""
+        snapshot = dict(self._stats)
+        # Live worker tasks, so a worker that died shows up here
+        snapshot["workers"] = sum(1 for task in self._tasks if not task.done())
+        snapshot["queued"] = self._queue.qsize()
+        snapshot["running"] = len(self._running)
+        return snapshot
@@ -0,0 +1,200 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from providers import PROVIDERS
+from upstream import UpstreamGovernor, UpstreamUnavailable
+from utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Thread pool that runs blocking model calls off the event loop
+LLM_THREADS = int(os.getenv("LLM_THREADS", "16"))
+
+# Backend selected by LLM_PROVIDER: "gemini" or the offline "stub"
+DEFAULT_PROVIDER = "gemini"
+DEFAULT_MODEL = "gemini-2.0-flash-exp"
+PLACEHOLDER_KEY = "your_gemini_api_key_here"
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Rate limit, concurrency cap, retries and circuit breaker shared by every model call
+governor = UpstreamGovernor()
+
+# Usage accounting sink (a usage.UsageRecorder), attached by the app lifespan
+_usage = None
+
+# Provider singleton; swapped atomically under _lock when settings change
+_lock = threading.Lock()
+_model = None
+_settings = {"provider": None, "api_key": None, "model_name": None}
+
+
+def configure(api_key=None, model_name=None, provider=None):
+    """Build the model provider once, rebuilding only when its settings change"""
+    global _model
+    provider = provider or os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER)
+    api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY")
+    if provider == "gemini":
+        model_name = model_name or os.getenv("GEMINI_MODEL", DEFAULT_MODEL)
+    else:
+        model_name = model_name or provider
+
+    with _lock:
+        if (provider, api_key, model_name) == (_settings["provider"], _settings["api_key"], _settings["model_name"]):
+            return _model
+
+        if provider not in PROVIDERS:
+            _model = None
+            logger.error(f"Unknown LLM_PROVIDER '{provider}'; AI agents will use fallback responses")
+        elif provider == "gemini" and (not api_key or api_key == PLACEHOLDER_KEY):
+            _model = None
+            logger.warning("GEMINI_API_KEY not configured; AI agents will use fallback responses")
+        else:
+            try:
+                if provider == "gemini":
+                    _model = PROVIDERS[provider](model_name, api_key)
+                else:
+                    _model = PROVIDERS[provider](model_name)
+                logger.info(f"{provider} provider ready with model '{model_name}'")
+            except Exception as e:
+                _model = None
+                logger.error(f"{provider} provider initialization failed: {e}")
+        _settings.update(provider=provider, api_key=api_key, model_name=model_name)
+        return _model
+
+
+def get_model():
+    """The shared provider, or None when no backend is configured"""
+    return _model
+
+
+def get_model_name():
+    """Name of the configured model (part of response cache keys)"""
+    return _settings["model_name"]
+
+
+def get_model_label():
+    """Display name of the configured model for agent responses"""
+    return _model.label if _model is not None else None
+
+
+def status():
+    """Current provider settings (without the key itself)"""
+    return {
+        "configured": _model is not None,
+        "provider": _settings["provider"],
+        "model": _settings["model_name"],
+        "executor_running": _executor is not None,
+    }
+
+
+def diagnostics():
+    """Provider status plus upstream limiter and circuit breaker state"""
+    return dict(status(), upstream=governor.stats())
+
+
+def set_usage_recorder(recorder):
+    """Record every model call through recorder (None to stop recording)"""
+    global _usage
+    _usage = recorder
+
+
+async def _record_usage(agent, model, started, outcome, prompt_tokens, response_tokens):
+    if _usage is None:
+        return
+    await _usage.record(
+        agent, model.name, model.model_name,
+        prompt_tokens=prompt_tokens,
+        response_tokens=response_tokens,
+        latency_ms=(time.perf_counter() - started) * 1000,
+        outcome=outcome,
+        cost=model.cost(prompt_tokens, response_tokens),
+    )
+
+
+def _outcome(error):
+    return "rejected" if isinstance(error, UpstreamUnavailable) else "error"
+
+
+def start(max_workers=LLM_THREADS):
+    """Create the LLM executor (called from the app lifespan)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        logger.info(f"LLM executor started with {max_workers} threads")
+    return _executor
+
+
+def shutdown():
+    """Stop the LLM executor without waiting for in-flight calls"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def generate_content(model, prompt, agent="other"):
+    """Await the provider's response text without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Latency covers limiter waits and retries: what the agent actually waited
+    started = time.perf_counter()
+    try:
+        text, prompt_tokens, response_tokens = await governor.call(
+            lambda: loop.run_in_executor(start(), model.complete, prompt)
+        )
+    except Exception as e:
+        await _record_usage(agent, model, started, _outcome(e), estimate_tokens(prompt), 0)
+        raise
+    await _record_usage(agent, model, started, "ok", prompt_tokens, response_tokens)
+    return text
+
+
+async def stream_content(model, prompt, agent="other"):
+    """Async-iterate text chunks from the provider's streaming call"""
+    started = time.perf_counter()
+    parts = []
+    try:
+        async for chunk in governor.stream(lambda: _stream_once(model, prompt)):
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        await _record_usage(agent, model, started, _outcome(e), estimate_tokens(prompt), estimate_tokens("".join(parts)))
+        raise
+    await _record_usage(agent, model, started, "ok", estimate_tokens(prompt), estimate_tokens("".join(parts)))
+
+
+async def _stream_once(model, prompt):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce():
+        # Runs on the executor; hands each chunk back to the event loop
+        try:
+            for chunk in model.stream(prompt):
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, ("chunk", chunk))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, ("end", None))
+
+    loop.run_in_executor(start(), produce)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                break
+    finally:
+        # Stop pulling from upstream if the consumer went away
+        cancelled.set()
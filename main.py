@@ -1,116 +1,116 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Literal, Optional
 import uvicorn
 from datetime import datetime
-import pytz
-import sqlite3
 import os
+import json
+import hmac
 import asyncio
 from contextlib import asynccontextmanager
 import logging
 from dotenv import load_dotenv
+import uuid
 
 # Load environment variables
 load_dotenv()
 
+import llm
+import prompts
+from cache import ResponseCache, make_key
+from chat_sessions import ChatSessions
+from usage import UsageRecorder
+from singleflight import SharedStream, SingleFlight
+from database import AsyncDatabase, ConnectionPool, DB_PATH
+from http_pool import PooledClient
+from jobs import JobQueue
+from migrations import migrate, PREVIEW_LENGTH, TODO_PRIORITY_RANK
+from write_queue import WriteBehindQueue
+from utils import truncate_text
+from weather import WeatherService
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize database
-def init_db():
-    try:
-        conn = sqlite3.connect("agent_system.db")
-        cursor = conn.cursor()
-        
-        # Create tables if they don't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS todos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task TEXT NOT NULL,
-            completed BOOLEAN NOT NULL DEFAULT 0,
-            priority TEXT DEFAULT 'medium',
-            category TEXT DEFAULT 'general',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT NOT NULL,
-            reminder_time TIMESTAMP NOT NULL,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS task_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT NOT NULL,
-            agent_type TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS blog_content (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic TEXT NOT NULL,
-            content TEXT NOT NULL,
-            word_count INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_message TEXT NOT NULL,
-            bot_response TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS code_snippets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            language TEXT NOT NULL,
-            code TEXT NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.error(f"Database initialization failed: {e}")
+# Shared async database, write-behind queue, response cache and HTTP client, created in the lifespan
+db: Optional[AsyncDatabase] = None
+write_queue: Optional[WriteBehindQueue] = None
+response_cache: Optional[ResponseCache] = None
+job_queue: Optional[JobQueue] = None
+chat_sessions: Optional[ChatSessions] = None
+usage_recorder: Optional[UsageRecorder] = None
+http_client: Optional[PooledClient] = None
+weather_service: Optional[WeatherService] = None
 
-# Initialize database on startup
-init_db()
+# Concurrent identical generations share one model call (or one model stream)
+generations = SingleFlight()
+streams = SharedStream()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global db, write_queue, response_cache, job_queue, chat_sessions, usage_recorder, http_client, weather_service
     # Startup
     logger.info("Starting Multi-Agent System API...")
+    readers = int(os.getenv("DB_POOL_READERS", "4"))
+    pool = ConnectionPool(
+        DB_PATH,
+        readers=readers,
+        busy_timeout=int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+        max_retries=int(os.getenv("DB_MAX_RETRIES", "3")),
+    )
+    db = AsyncDatabase(pool, max_workers=int(os.getenv("DB_EXECUTOR_THREADS", str(readers + 1))))
+    applied = pool.write(migrate)
+    logger.info(f"Database pool ready ({pool.journal_mode} journal, {len(applied)} migrations applied)")
+    write_queue = WriteBehindQueue(db)
+    write_queue.start()
+    response_cache = ResponseCache(db, write_queue)
+    purged = await response_cache.purge_expired()
+    logger.info(f"Response cache ready ({purged} expired entries purged)")
+    chat_sessions = ChatSessions(db)
+    usage_recorder = UsageRecorder(db, write_queue)
+    llm.set_usage_recorder(usage_recorder)
+    # One keep-alive pool for all outbound HTTP, reused across requests
+    http_client = PooledClient()
+    weather_service = WeatherService(http_client)
+    # Keeps popular and frequently requested locations warm in the background
+    weather_service.start()
+    llm.start()
+    llm.configure()
+    job_queue = JobQueue(db, JOB_HANDLERS)
+    await job_queue.start()
     yield
     # Shutdown
     logger.info("Shutting down Multi-Agent System API...")
+    # Interrupted jobs stay 'running' in the table and are requeued on the next start
+    await job_queue.stop()
+    job_queue = None
+    await chat_sessions.stop()
+    chat_sessions = None
+    # Usage rows go through the write queue, so stop recording before it flushes
+    llm.set_usage_recorder(None)
+    usage_recorder = None
+    # Flush queued writes before anything they depend on goes away
+    await write_queue.stop()
+    write_queue = None
+    response_cache = None
+    llm.shutdown()
+    await weather_service.stop()
+    weather_service = None
+    await http_client.aclose()
+    http_client = None
+    db.close()
+    db = None
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
     title="Multi-Agent System API",
     description="AI-powered multi-agent system with enhanced AI and weather features",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -144,20 +144,96 @@ class BlogRequest(BaseModel):
 class WeatherRequest(BaseModel):
     location: str
 
+# Maximum locations per batch weather request
+MAX_WEATHER_BATCH = 50
+
+class WeatherBatchRequest(BaseModel):
+    locations: List[str] = Field(..., min_length=1, max_length=MAX_WEATHER_BATCH)
+    kind: Literal["current", "forecast"] = "current"
+
 class ChatRequest(BaseModel):
     message: str
+    # Omit to start a new conversation; the response carries the id to send next time
+    session_id: Optional[str] = Field(default=None, max_length=64)
 
 class CodeRequest(BaseModel):
     description: str
     language: str = "python"
 
+# Maximum items per list in a bulk todo request
+MAX_BULK_ITEMS = 500
+
+class TodoUpdate(BaseModel):
+    id: int
+    completed: bool
+
+class TodoBulkRequest(BaseModel):
+    add: List[TodoItem] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[TodoUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[int] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+
+
+# Page size bounds for list endpoints
+MAX_PAGE_SIZE = 200
+
+# Column projections for ?fields=summary list responses
+BLOG_SUMMARY_COLUMNS = "id, topic, word_count, preview, created_at"
+SNIPPET_SUMMARY_COLUMNS = "id, title, language, preview, created_at"
 
+# Helper functions to get the shared database and services
+def get_db():
+    if db is None:
+        raise RuntimeError("Database pool is not initialized")
+    return db
 
-# Helper function to get database connection
-def get_db_connection():
-    conn = sqlite3.connect("agent_system.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_write_queue():
+    if write_queue is None:
+        raise RuntimeError("Write queue is not initialized")
+    return write_queue
+
+def get_cache():
+    if response_cache is None:
+        raise RuntimeError("Response cache is not initialized")
+    return response_cache
+
+def get_usage():
+    if usage_recorder is None:
+        raise RuntimeError("Usage recorder is not initialized")
+    return usage_recorder
+
+async def cached_response(key, agent, bypass_cache=False, refresh=False):
+    # bypass skips the cache entirely; refresh skips the read but stores the new result
+    if bypass_cache or refresh:
+        get_cache().record_bypass()
+        return None
+    cached = await get_cache().get(key)
+    if cached is not None:
+        await get_usage().record(agent, llm.status()["provider"], llm.get_model_name(), cached=True)
+    return cached
+
+def get_chat():
+    if chat_sessions is None:
+        raise RuntimeError("Chat sessions are not initialized")
+    return chat_sessions
+
+def get_jobs():
+    if job_queue is None:
+        raise RuntimeError("Job queue is not initialized")
+    return job_queue
+
+def get_weather_service():
+    if weather_service is None:
+        raise RuntimeError("Weather service is not initialized")
+    return weather_service
+
+def require_admin(token):
+    # Admin routes need the X-Admin-Token header to match ADMIN_TOKEN; without it they stay closed
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set ADMIN_TOKEN to enable them")
+    if not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 # PWA Routes
 @app.get("/manifest.json")
@@ -173,6 +249,37 @@ async def get_service_worker():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.post("/llm/reload")
+async def reload_llm(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    # Re-read .env so a rotated GEMINI_API_KEY takes effect without a restart
+    load_dotenv(override=True)
+    await asyncio.to_thread(llm.configure)
+    return llm.status()
+
+@app.get("/llm/diagnostics")
+async def llm_diagnostics():
+    return dict(llm.diagnostics(), chat_context=get_chat().stats())
+
+@app.get("/usage")
+async def get_usage_rollup(days: int = Query(7, ge=1, le=365)):
+    """Model calls, tokens, latency and estimated cost per agent and per day"""
+    try:
+        return await get_usage().rollup(days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = get_cache().stats()
+    stats["single_flight"] = generations.stats()
+    stats["shared_streams"] = streams.stats()
+    return stats
+
+@app.get("/db/stats")
+async def db_stats():
+    return dict(get_db().stats(), write_queue=get_write_queue().stats(), jobs=get_jobs().stats())
+
 # Routes
 @app.get("/")
 async def root():
@@ -183,16 +290,95 @@ async def root():
         "features": ["tasks", "chat", "content", "code", "weather"]
     }
 
+def _collect_stats(conn):
+    # One read transaction so all counts come from the same snapshot
+    conn.execute("BEGIN")
+    todos = conn.execute(
+        "SELECT COUNT(*) AS total, COALESCE(SUM(completed), 0) AS completed FROM todos"
+    ).fetchone()
+    by_priority = {
+        row["priority"]: row["count"]
+        for row in conn.execute("SELECT priority, COUNT(*) AS count FROM todos GROUP BY priority")
+    }
+    by_category = {
+        row["category"]: row["count"]
+        for row in conn.execute("SELECT category, COUNT(*) AS count FROM todos GROUP BY category")
+    }
+    counts = conn.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM chat_history) AS chat_messages,
+            (SELECT COUNT(*) FROM blog_content) AS blogs,
+            (SELECT COUNT(*) FROM code_snippets) AS code_snippets
+    ''').fetchone()
+    
+    total, completed = todos["total"], todos["completed"]
+    return {
+        "total_tasks": total,
+        "completed_tasks": completed,
+        "pending_tasks": total - completed,
+        "completion_rate": round(completed / total * 100, 1) if total else 0,
+        "tasks_by_priority": by_priority,
+        "tasks_by_category": by_category,
+        "chat_messages": counts["chat_messages"],
+        "blogs": counts["blogs"],
+        "code_snippets": counts["code_snippets"],
+    }
+
+@app.get("/stats")
+async def get_stats():
+    try:
+        stats = await get_db().read(_collect_stats)
+        stats["timestamp"] = datetime.now().isoformat()
+        return stats
+    except Exception as e:
+        logger.error(f"Error computing stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Personal Assistant Agent routes
+# Sort options for the todo list: (keyset order columns, descending)
+TODO_SORTS = {
+    "newest": (["created_at"], True),
+    "oldest": (["created_at"], False),
+    "priority": ([TODO_PRIORITY_RANK, "created_at"], True),
+}
+
 @app.get("/todos")
-async def get_todos():
+async def get_todos(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    completed: Optional[bool] = None,
+    priority: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: Literal["newest", "oldest", "priority"] = "newest"
+):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM todos ORDER BY created_at DESC")
-        todos = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return {"todos": todos}
+        conditions, params = [], []
+        if completed is not None:
+            conditions.append("completed = ?")
+            params.append(completed)
+        if priority:
+            conditions.append("priority = ?")
+            params.append(priority)
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if q:
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("task LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        
+        order_by, descending = TODO_SORTS[sort]
+        page = await get_db().fetch_page(
+            "todos", order_by, limit,
+            before=before, after=after,
+            where=" AND ".join(conditions) or None, params=params,
+            descending=descending
+        )
+        return {"todos": page["items"], "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching todos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -200,15 +386,10 @@ async def get_todos():
 @app.post("/todos/add")
 async def add_todo(todo: TodoItem):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        todo_id = await get_db().execute(
             "INSERT INTO todos (task, completed, priority, category) VALUES (?, ?, ?, ?)",
             (todo.task, todo.completed, todo.priority, todo.category)
         )
-        conn.commit()
-        todo_id = cursor.lastrowid
-        conn.close()
         return {
             "id": todo_id,
             "task": todo.task,
@@ -223,11 +404,7 @@ async def add_todo(todo: TodoItem):
 @app.put("/todos/{todo_id}")
 async def update_todo(todo_id: int, completed: bool):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE todos SET completed = ? WHERE id = ?", (completed, todo_id))
-        conn.commit()
-        conn.close()
+        await get_db().execute("UPDATE todos SET completed = ? WHERE id = ?", (completed, todo_id))
         return {"id": todo_id, "completed": completed}
     except Exception as e:
         logger.error(f"Error updating todo: {e}")
@@ -236,89 +413,75 @@ async def update_todo(todo_id: int, completed: bool):
 @app.delete("/todos/{todo_id}")
 async def delete_todo(todo_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM todos WHERE id = ?", (todo_id,))
-        conn.commit()
-        conn.close()
+        await get_db().execute("DELETE FROM todos WHERE id = ?", (todo_id,))
         return {"message": "Todo deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting todo: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Content Creator Agent routes
-@app.post("/generate/blog")
-async def generate_blog(request: BlogRequest):
+def _apply_bulk(conn, request):
+    results = {"added": [], "updated": [], "deleted": []}
+    
+    if request.add:
+        conn.executemany(
+            "INSERT INTO todos (task, completed, priority, category) VALUES (?, ?, ?, ?)",
+            [(t.task, t.completed, t.priority, t.category) for t in request.add]
+        )
+        # AUTOINCREMENT ids are consecutive while we hold the writer
+        last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'todos'").fetchone()[0]
+        first_id = last_id - len(request.add) + 1
+        results["added"] = [
+            {"id": first_id + i, "task": t.task, "completed": t.completed,
+             "priority": t.priority, "category": t.category, "status": "added"}
+            for i, t in enumerate(request.add)
+        ]
+    
+    def existing_ids(ids):
+        if not ids:
+            return set()
+        placeholders = ", ".join("?" * len(ids))
+        return {row[0] for row in conn.execute(f"SELECT id FROM todos WHERE id IN ({placeholders})", list(ids))}
+    
+    if request.update:
+        found = existing_ids({u.id for u in request.update})
+        conn.executemany(
+            "UPDATE todos SET completed = ? WHERE id = ?",
+            [(u.completed, u.id) for u in request.update if u.id in found]
+        )
+        results["updated"] = [
+            {"id": u.id, "completed": u.completed, "status": "updated" if u.id in found else "not_found"}
+            for u in request.update
+        ]
+    
+    if request.delete:
+        found = existing_ids(set(request.delete))
+        conn.executemany("DELETE FROM todos WHERE id = ?", [(todo_id,) for todo_id in found])
+        results["deleted"] = [
+            {"id": todo_id, "status": "deleted" if todo_id in found else "not_found"}
+            for todo_id in request.delete
+        ]
+    
+    return results
+
+@app.post("/todos/bulk")
+async def bulk_todos(request: TodoBulkRequest):
     try:
-        gemini_key = os.getenv("GEMINI_API_KEY")
-        
-        if gemini_key and gemini_key != "your_gemini_api_key_here":
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=gemini_key)
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                
-                # Map length to word count
-                length_map = {
-                    "Short": "300-400 words",
-                    "Medium": "600-800 words", 
-                    "Long": "1200-1500 words"
-                }
-                word_count_instruction = length_map.get(request.length, "600-800 words")
-                
-                # Create style-specific prompts
-                style_prompts = {
-                    "informative": f"Write a comprehensive, informative blog post about {request.topic}. Use a professional tone with clear explanations and factual information.",
-                    "casual": f"Write a casual, friendly blog post about {request.topic}. Use a conversational tone as if talking to a friend.",
-                    "professional": f"Write a professional, business-oriented blog post about {request.topic}. Use formal language suitable for corporate audiences.",
-                    "creative": f"Write a creative, engaging blog post about {request.topic}. Use storytelling elements and imaginative language."
-                }
-                
-                prompt = f"""
-                {style_prompts.get(request.style, style_prompts['informative'])}
-                
-                Requirements:
-                - Length: {word_count_instruction}
-                - Include a compelling title
-                - Use proper headings and structure with markdown formatting
-                - Make it engaging and well-researched
-                - Include practical insights or actionable advice
-                - Use bullet points and numbered lists where appropriate
-                - Add a conclusion that summarizes key points
-                
-                Topic: {request.topic}
-                
-                Please format the response with proper markdown headers (# ## ###) and structure.
-                """
-                
-                response = model.generate_content(prompt)
-                content = response.text
-                word_count = len(content.split())
-                
-                # Save to database
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute(
-                    "INSERT INTO blog_content (topic, content, word_count) VALUES (?, ?, ?)",
-                    (request.topic, content, word_count)
-                )
-                
-                conn.commit()
-                conn.close()
-                
-                return {
-                    "content": content, 
-                    "topic": request.topic, 
-                    "length": request.length, 
-                    "style": request.style,
-                    "word_count": word_count,
-                    "model": "Gemini 2.0 Flash"
-                }
-            except Exception as e:
-                logger.error(f"Gemini API error: {e}")
-                # Fallback content
-                fallback_content = f"""
+        # Adds, updates and deletes commit (or roll back) together
+        return await get_db().write(lambda conn: _apply_bulk(conn, request))
+    except Exception as e:
+        logger.error(f"Error applying bulk todo changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Content Creator Agent routes
+def _blog_key(request):
+    return make_key(
+        "blog", llm.get_model_name(),
+        topic=request.topic, length=request.length, style=request.style
+    )
+
+def _blog_fallback(request):
+    # Served when the model call fails
+    fallback_content = f"""
 # {request.topic}
 
 This is a sample blog post about {request.topic}. 
@@ -336,16 +499,68 @@ Here we would explore the various aspects of {request.topic}, providing insights
 In conclusion, {request.topic} offers many opportunities for learning and growth.
 
 *Note: Configure GEMINI_API_KEY for AI-generated content.*
-                """
+    """
+    
+    return {
+        "content": fallback_content,
+        "topic": request.topic,
+        "length": request.length,
+        "style": request.style,
+        "word_count": len(fallback_content.split()),
+        "note": "Fallback content - Configure Gemini API for AI generation"
+    }
+
+@app.post("/generate/blog")
+async def generate_blog(request: BlogRequest, bypass_cache: bool = False, refresh: bool = False):
+    try:
+        model = llm.get_model()
+        
+        if model is not None:
+            try:
+                cache_key = _blog_key(request)
+                cached = await cached_response(cache_key, "blog", bypass_cache, refresh)
+                if cached is not None:
+                    return {
+                        "content": cached["content"],
+                        "topic": request.topic,
+                        "length": request.length,
+                        "style": request.style,
+                        "word_count": cached["word_count"],
+                        "model": llm.get_model_label(),
+                        "cached": True
+                    }
+                
+                async def produce():
+                    prompt = prompts.blog_prompt(request.topic, request.length, request.style)
+                    
+                    content = await llm.generate_content(model, prompt, agent="blog")
+                    word_count = len(content.split())
+                    
+                    # Save to database
+                    await get_write_queue().submit(
+                        "INSERT INTO blog_content (topic, content, word_count, preview) VALUES (?, ?, ?, ?)",
+                        (request.topic, content, word_count, truncate_text(content, PREVIEW_LENGTH))
+                    )
+                    result = {"content": content, "word_count": word_count}
+                    if not bypass_cache:
+                        await get_cache().set(cache_key, "blog", result)
+                    return result
+                
+                # Identical requests already in flight share that call (and its saved row)
+                result = await generations.run((cache_key, bypass_cache), produce)
                 
                 return {
-                    "content": fallback_content,
-                    "topic": request.topic,
-                    "length": request.length,
+                    "content": result["content"], 
+                    "topic": request.topic, 
+                    "length": request.length, 
                     "style": request.style,
-                    "word_count": len(fallback_content.split()),
-                    "note": "Fallback content - Configure Gemini API for AI generation"
+                    "word_count": result["word_count"],
+                    "model": llm.get_model_label(),
+                    "cached": False
                 }
+            except Exception as e:
+                logger.error(f"Model API error: {e}")
+                return _blog_fallback(request)
         else:
             # Fallback when no API key
             fallback_content = f"""
@@ -374,305 +589,141 @@ Your AI-generated blog post would appear here with proper formatting, engaging c
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/blogs")
-async def get_blogs():
+async def get_blogs(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full"
+):
+    try:
+        columns = BLOG_SUMMARY_COLUMNS if fields == "summary" else "*"
+        page = await get_db().fetch_page("blog_content", "created_at", limit, before=before, after=after, columns=columns)
+        return {"blogs": page["items"], "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/blogs/{blog_id}")
+async def get_blog(blog_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM blog_content ORDER BY created_at DESC")
-        blogs = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return {"blogs": blogs}
+        blog = await get_db().fetch_one("SELECT * FROM blog_content WHERE id = ?", (blog_id,))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if blog is None:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    return blog
 
 # Enhanced Weather Agent routes
 @app.post("/weather")
 async def get_weather(request: WeatherRequest):
     try:
-        weather_key = os.getenv("WEATHER_API_KEY")
-        
-        if weather_key and weather_key != "your_weather_api_key_here":
-            import requests
-            url = "http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "q": request.location,
-                "appid": weather_key,
-                "units": "metric"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Get weather icon
-                weather_icons = {
-                    "clear": "☀️",
-                    "clouds": "☁️",
-                    "rain": "🌧️",
-                    "drizzle": "🌦️",
-                    "thunderstorm": "⛈️",
-                    "snow": "❄️",
-                    "mist": "🌫️",
-                    "fog": "🌫️",
-                    "haze": "🌫️"
-                }
-                
-                weather_main = data['weather'][0]['main'].lower()
-                icon = weather_icons.get(weather_main, "🌤️")
-                
-                return {
-                    "location": f"{data['name']}, {data['sys']['country']}",
-                    "temperature": round(data['main']['temp']),
-                    "feels_like": round(data['main']['feels_like']),
-                    "description": data['weather'][0]['description'].title(),
-                    "humidity": data['main']['humidity'],
-                    "pressure": data['main']['pressure'],
-                    "wind_speed": round(data['wind']['speed'] * 3.6, 1),
-                    "wind_direction": data['wind'].get('deg', 0),
-                    "visibility": data.get('visibility', 0) / 1000,
-                    "icon": icon,
-                    "sunrise": datetime.fromtimestamp(data['sys']['sunrise']).strftime("%H:%M"),
-                    "sunset": datetime.fromtimestamp(data['sys']['sunset']).strftime("%H:%M")
-                }
-            else:
-                return {"error": "Location not found"}
-        else:
-            return {
-                "error": "Weather API key not configured",
-                "message": "Please set WEATHER_API_KEY in your .env file"
-            }
+        return await get_weather_service().current(request.location)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/weather/batch")
+async def get_weather_batch(request: WeatherBatchRequest):
+    """Weather for several locations in one round trip; failures are reported per location"""
+    try:
+        return await get_weather_service().batch(request.locations, kind=request.kind)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/weather/forecast/{location}")
 async def get_forecast(location: str):
     try:
-        weather_key = os.getenv("WEATHER_API_KEY")
-        
-        if weather_key and weather_key != "your_weather_api_key_here":
-            import requests
-            url = "http://api.openweathermap.org/data/2.5/forecast"
-            params = {
-                "q": location,
-                "appid": weather_key,
-                "units": "metric"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Process forecast data (API returns 3-hour intervals)
-                daily_forecasts = {}
-                
-                for item in data['list']:
-                    date = datetime.fromtimestamp(item['dt']).date()
-                    
-                    if date not in daily_forecasts:
-                        daily_forecasts[date] = {
-                            "date": date.strftime("%Y-%m-%d"),
-                            "day": date.strftime("%A"),
-                            "temperatures": [],
-                            "descriptions": [],
-                            "humidity": [],
-                            "wind_speeds": [],
-                            "precipitation": 0
-                        }
-                    
-                    daily_forecasts[date]["temperatures"].append(item['main']['temp'])
-                    daily_forecasts[date]["descriptions"].append(item['weather'][0]['description'])
-                    daily_forecasts[date]["humidity"].append(item['main']['humidity'])
-                    daily_forecasts[date]["wind_speeds"].append(item['wind']['speed'] * 3.6)
-                    
-                    # Check for precipitation
-                    if 'rain' in item:
-                        daily_forecasts[date]["precipitation"] += item['rain'].get('3h', 0)
-                    if 'snow' in item:
-                        daily_forecasts[date]["precipitation"] += item['snow'].get('3h', 0)
-                
-                # Create final forecast
-                forecast = []
-                for date, data_day in list(daily_forecasts.items())[:5]:  # 5 days
-                    weather_icons = {
-                        "clear": "☀️",
-                        "clouds": "☁️",
-                        "rain": "🌧️",
-                        "drizzle": "🌦️",
-                        "thunderstorm": "⛈️",
-                        "snow": "❄️",
-                        "mist": "🌫️",
-                        "fog": "🌫️",
-                        "haze": "🌫️"
-                    }
-                    
-                    most_common_desc = max(set(data_day["descriptions"]), key=data_day["descriptions"].count)
-                    icon = weather_icons.get(most_common_desc.split()[0].lower(), "🌤️")
-                    
-                    forecast.append({
-                        "date": data_day["date"],
-                        "day": data_day["day"],
-                        "high_temperature": round(max(data_day["temperatures"])),
-                        "low_temperature": round(min(data_day["temperatures"])),
-                        "description": most_common_desc.title(),
-                        "icon": icon,
-                        "humidity": round(sum(data_day["humidity"]) / len(data_day["humidity"])),
-                        "wind_speed": round(sum(data_day["wind_speeds"]) / len(data_day["wind_speeds"]), 1),
-                        "precipitation_chance": min(100, round(data_day["precipitation"] * 10))
-                    })
-                
-                return {
-                    "location": f"{data['city']['name']}, {data['city']['country']}",
-                    "forecast": forecast,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {"error": "Location not found"}
-        else:
-            return {
-                "error": "Weather API key not configured",
-                "message": "Please set WEATHER_API_KEY in your .env file"
-            }
+        return await get_weather_service().forecast(location)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/weather/cache/stats")
+async def weather_cache_stats():
+    return get_weather_service().stats()
+
+@app.delete("/weather/cache")
+async def clear_weather_cache(location: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """Drop cached weather for one location, or everything when location is omitted"""
+    require_admin(x_admin_token)
+    return {"invalidated": get_weather_service().invalidate(location), "location": location}
+
 # Chatbot Agent routes
 @app.post("/chat")
 async def chat(request: ChatRequest):
     try:
-        # Check if Gemini API key is available
-        gemini_key = os.getenv("GEMINI_API_KEY")
+        session_id = request.session_id or uuid.uuid4().hex
+        context = None
+        # Check if a model provider is configured
+        model = llm.get_model()
         
-        if gemini_key and gemini_key != "your_gemini_api_key_here":
-            # Use Gemini API
+        if model is not None:
             try:
-                import google.generativeai as genai
-                genai.configure(api_key=gemini_key)
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                
-                response = model.generate_content(f"""
-                You are a helpful AI assistant. Respond to this message in a friendly and helpful way:
-                
-                User: {request.message}
-                
-                Keep your response concise but informative.
-                """)
-                
-                bot_response = response.text
+                prompt, context = await get_chat().prompt(session_id, request.message)
+                bot_response = await llm.generate_content(model, prompt, agent="chat")
             except Exception as e:
-                logger.error(f"Gemini API error: {e}")
+                logger.error(f"Model API error: {e}")
                 bot_response = f"I'm here to help! You asked: '{request.message}'. While I'm having trouble with my AI features right now, I can still assist you with basic tasks. Try using the other features in the system!"
         else:
             # Fallback response
             bot_response = f"Hello! You said: '{request.message}'. I'm your AI assistant, but I need a Gemini API key to provide intelligent responses. Please configure GEMINI_API_KEY in your .env file."
         
         # Save to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO chat_history (user_message, bot_response) VALUES (?, ?)",
-            (request.message, bot_response)
+        saved = await get_write_queue().submit(
+            "INSERT INTO chat_history (user_message, bot_response, session_id) VALUES (?, ?, ?)",
+            (request.message, bot_response, session_id)
         )
-        conn.commit()
-        conn.close()
+        if context and context["fold_due"]:
+            get_chat().schedule_fold(session_id, model, after=saved)
         
         return {
             "user_message": request.message,
             "bot_response": bot_response,
+            "session_id": session_id,
+            "context": context,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chat/history")
-async def get_chat_history():
+async def get_chat_history(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    session_id: Optional[str] = None
+):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM chat_history ORDER BY timestamp DESC LIMIT 20")
-        history = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return {"history": list(reversed(history))}
+        if session_id:
+            page = await get_db().fetch_page(
+                "chat_history", "timestamp", limit, before=before, after=after,
+                where="session_id = ?", params=(session_id,)
+            )
+        else:
+            page = await get_db().fetch_page("chat_history", "timestamp", limit, before=before, after=after)
+        # Pages are fetched newest-first; the conversation reads oldest-first
+        return {"history": page["items"][::-1], "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Code Generator Agent routes
-@app.post("/code/generate")
-async def generate_code(request: CodeRequest):
+@app.get("/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str):
     try:
-        gemini_key = os.getenv("GEMINI_API_KEY")
-        
-        if gemini_key and gemini_key != "your_gemini_api_key_here":
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=gemini_key)
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                
-                prompt = f"""
-                Generate {request.language} code for the following requirement:
-                {request.description}
-                
-                Requirements:
-                - Write clean, well-commented code
-                - Include error handling where appropriate
-                - Add example usage if applicable
-                - Follow best practices for {request.language}
-                - Make the code production-ready
-                - Include docstrings/comments explaining the functionality
-                - Use modern {request.language} features and conventions
-                
-                Provide only the code with comments, no additional explanation outside the code.
-                """
-                
-                response = model.generate_content(prompt)
-                code = response.text
-                
-                # Generate explanation
-                explanation_prompt = f"""
-                Explain this {request.language} code in simple terms:
-                
-                {code}
-                
-                Provide:
-                1. What the code does (main purpose)
-                2. How it works (step by step explanation)
-                3. Key features or concepts used
-                4. When and why to use this code
-                5. Any important notes about the implementation
-                
-                Make the explanation clear and educational for developers of all levels.
-                """
-                
-                explanation_response = model.generate_content(explanation_prompt)
-                explanation = explanation_response.text
-                
-                # Save to database
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                title = request.description[:50] + "..." if len(request.description) > 50 else request.description
-                
-                cursor.execute(
-                    "INSERT INTO code_snippets (title, language, code, description) VALUES (?, ?, ?, ?)",
-                    (title, request.language, code, explanation)
-                )
-                
-                conn.commit()
-                conn.close()
-                
-                return {
-                    "code": code,
-                    "language": request.language,
-                    "description": request.description,
-                    "explanation": explanation,
-                    "title": title,
-                    "model": "Gemini 2.0 Flash"
-                }
-            except Exception as e:
-                logger.error(f"Gemini API error: {e}")
-                # Fallback code
-                fallback_code = f"""
+        return await get_chat().session(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Code Generator Agent routes
+def _code_key(request):
+    return make_key(
+        "code", llm.get_model_name(),
+        description=request.description, language=request.language
+    )
+
+def _code_fallback(request, title):
+    # Served when the model call fails
+    fallback_code = f"""
 # {request.description}
 # This is a sample {request.language} code snippet
 
@@ -688,16 +739,70 @@ def sample_function():
 if __name__ == "__main__":
     result = sample_function()
     print(result)
-                """
+    """
+    
+    return {
+        "code": fallback_code,
+        "language": request.language,
+        "description": request.description,
+        "explanation": "This is a sample code snippet. Configure GEMINI_API_KEY for AI-generated code.",
+        "title": title,
+        "note": "Fallback code - Configure Gemini API for AI generation"
+    }
+
+def _explanation_url(snippet_id):
+    return f"/code/snippets/{snippet_id}/explanation" if snippet_id else None
+
+def _generated_code(request, title, result, cached):
+    snippet_id = result.get("snippet_id")
+    return {
+        "id": snippet_id,
+        "code": result["code"],
+        "language": request.language,
+        "description": request.description,
+        # Entries cached before explanations went lazy still carry one
+        "explanation": result.get("explanation"),
+        "explanation_url": _explanation_url(snippet_id),
+        "title": title,
+        "model": llm.get_model_label(),
+        "cached": cached
+    }
+
+@app.post("/code/generate")
+async def generate_code(request: CodeRequest, bypass_cache: bool = False, refresh: bool = False):
+    try:
+        title = prompts.snippet_title(request.description)
+        model = llm.get_model()
+        
+        if model is not None:
+            try:
+                cache_key = _code_key(request)
+                cached = await cached_response(cache_key, "code", bypass_cache, refresh)
+                if cached is not None:
+                    return _generated_code(request, title, cached, cached=True)
                 
-                return {
-                    "code": fallback_code,
-                    "language": request.language,
-                    "description": request.description,
-                    "explanation": "This is a sample code snippet. Configure GEMINI_API_KEY for AI-generated code.",
-                    "title": title,
-                    "note": "Fallback code - Configure Gemini API for AI generation"
-                }
+                async def produce():
+                    prompt = prompts.code_prompt(request.description, request.language)
+                    
+                    code = await llm.generate_content(model, prompt, agent="code")
+                    
+                    # Save to database; the explanation is generated on demand
+                    saved = await get_write_queue().submit(
+                        "INSERT INTO code_snippets (title, language, code, preview) VALUES (?, ?, ?, ?)",
+                        (title, request.language, code, truncate_text(code, PREVIEW_LENGTH))
+                    )
+                    result = {"code": code, "snippet_id": await saved}
+                    if not bypass_cache:
+                        await get_cache().set(cache_key, "code", result)
+                    return result
+                
+                # Identical requests already in flight share that call (and its saved row)
+                result = await generations.run((cache_key, bypass_cache), produce)
+                
+                return _generated_code(request, title, result, cached=False)
+            except Exception as e:
+                logger.error(f"Model API error: {e}")
+                return _code_fallback(request, title)
         else:
             # Fallback when no API key
             fallback_code = f"""
@@ -720,15 +825,391 @@ print("Then you'll get AI-generated code here!")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/code/snippets")
-async def get_code_snippets():
+async def get_code_snippets(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full"
+):
+    try:
+        columns = SNIPPET_SUMMARY_COLUMNS if fields == "summary" else "*"
+        page = await get_db().fetch_page("code_snippets", "created_at", limit, before=before, after=after, columns=columns)
+        return {"snippets": page["items"], "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/code/snippets/{snippet_id}")
+async def get_code_snippet(snippet_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM code_snippets ORDER BY created_at DESC")
-        snippets = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return {"snippets": snippets}
+        snippet = await get_db().fetch_one("SELECT * FROM code_snippets WHERE id = ?", (snippet_id,))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if snippet is None:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    return snippet
+
+@app.get("/code/snippets/{snippet_id}/explanation")
+async def get_code_explanation(snippet_id: int):
+    """Explain a snippet on first request and keep the result in its description column"""
+    try:
+        snippet = await get_db().fetch_one(
+            "SELECT id, language, code, description FROM code_snippets WHERE id = ?", (snippet_id,)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if snippet is None:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    if snippet["description"]:
+        return {"id": snippet_id, "explanation": snippet["description"], "cached": True}
+    
+    model = llm.get_model()
+    if model is None:
+        return {
+            "id": snippet_id,
+            "explanation": "Configure GEMINI_API_KEY in your .env file for AI-generated explanations.",
+            "note": "Configure GEMINI_API_KEY for AI code explanations"
+        }
+    
+    async def produce():
+        explanation = await llm.generate_content(
+            model, prompts.explanation_prompt(snippet["code"], snippet["language"]), agent="explanation"
+        )
+        saved = await get_write_queue().submit(
+            "UPDATE code_snippets SET description = ? WHERE id = ? AND description IS NULL",
+            (explanation, snippet_id)
+        )
+        await saved
+        return explanation
+    
+    try:
+        explanation = await generations.run(("explanation", snippet_id), produce)
+    except Exception as e:
+        logger.error(f"Model API error: {e}")
+        return {
+            "id": snippet_id,
+            "explanation": "Explanation is unavailable right now. Please try again later.",
+            "note": "Fallback explanation - Gemini API request failed"
+        }
+    return {"id": snippet_id, "explanation": explanation, "cached": False}
+
+# Streaming variants (Server-Sent Events)
+def _sse(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+def _sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stream_field(model, prompt, field, parts, agent):
+    # Relay model chunks as token events, collecting the full text in parts
+    async for chunk in llm.stream_content(model, prompt, agent=agent):
+        parts.append(chunk)
+        yield {"type": "token", "field": field, "text": chunk}
+
+NOT_CONFIGURED_EVENT = {"type": "error", "detail": "Configure GEMINI_API_KEY for AI generation"}
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    model = llm.get_model()
+    session_id = request.session_id or uuid.uuid4().hex
+    
+    async def events():
+        if model is None:
+            yield _sse(NOT_CONFIGURED_EVENT)
+            return
+        parts = []
+        try:
+            prompt, context = await get_chat().prompt(session_id, request.message)
+            async for event in _stream_field(model, prompt, "bot_response", parts, "chat"):
+                yield _sse(event)
+        except Exception as e:
+            logger.error(f"Model streaming error: {e}")
+            yield _sse({"type": "error", "detail": str(e)})
+            return
+        
+        bot_response = "".join(parts)
+        saved = await get_write_queue().submit(
+            "INSERT INTO chat_history (user_message, bot_response, session_id) VALUES (?, ?, ?)",
+            (request.message, bot_response, session_id)
+        )
+        if context["fold_due"]:
+            get_chat().schedule_fold(session_id, model, after=saved)
+        yield _sse({
+            "type": "done",
+            "user_message": request.message,
+            "bot_response": bot_response,
+            "session_id": session_id,
+            "context": context,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    return _sse_response(events())
+
+async def _blog_events(request, model, bypass_cache=False, refresh=False):
+    # Token, error and done events for a streamed blog post; shared by the SSE route and jobs
+    cache_key = _blog_key(request)
+    done = {
+        "type": "done",
+        "topic": request.topic,
+        "length": request.length,
+        "style": request.style,
+        "model": llm.get_model_label()
+    }
+    cached = await cached_response(cache_key, "blog", bypass_cache, refresh)
+    if cached is not None:
+        yield {"type": "token", "field": "content", "text": cached["content"]}
+        yield dict(done, word_count=cached["word_count"], cached=True)
+        return
+    
+    parts = []
+    prompt = prompts.blog_prompt(request.topic, request.length, request.style)
+    try:
+        async for event in _stream_field(model, prompt, "content", parts, "blog"):
+            yield event
+    except Exception as e:
+        logger.error(f"Model streaming error: {e}")
+        yield {"type": "error", "detail": str(e)}
+        return
+    
+    content = "".join(parts)
+    word_count = len(content.split())
+    await get_write_queue().submit(
+        "INSERT INTO blog_content (topic, content, word_count, preview) VALUES (?, ?, ?, ?)",
+        (request.topic, content, word_count, truncate_text(content, PREVIEW_LENGTH))
+    )
+    if not bypass_cache:
+        await get_cache().set(cache_key, "blog", {"content": content, "word_count": word_count})
+    yield dict(done, word_count=word_count, cached=False)
+
+def _shared_blog_events(request, model, bypass_cache=False, refresh=False):
+    # Identical blog streams in flight, from SSE clients and jobs alike, share one model stream
+    return streams.subscribe(
+        (_blog_key(request), bypass_cache),
+        lambda: _blog_events(request, model, bypass_cache, refresh)
+    )
+
+@app.post("/generate/blog/stream")
+async def generate_blog_stream(request: BlogRequest, bypass_cache: bool = False, refresh: bool = False):
+    model = llm.get_model()
+    
+    async def events():
+        if model is None:
+            yield _sse(NOT_CONFIGURED_EVENT)
+            return
+        async for event in _shared_blog_events(request, model, bypass_cache, refresh):
+            yield _sse(event)
+    
+    return _sse_response(events())
+
+async def _code_events(request, model, bypass_cache=False, refresh=False):
+    # Token, error and done events for streamed code; shared by the SSE route and jobs
+    title = prompts.snippet_title(request.description)
+    cache_key = _code_key(request)
+    done = {
+        "type": "done",
+        "language": request.language,
+        "description": request.description,
+        "title": title,
+        "model": llm.get_model_label()
+    }
+    cached = await cached_response(cache_key, "code", bypass_cache, refresh)
+    if cached is not None:
+        snippet_id = cached.get("snippet_id")
+        yield {"type": "token", "field": "code", "text": cached["code"]}
+        if cached.get("explanation"):
+            yield {"type": "token", "field": "explanation", "text": cached["explanation"]}
+        yield dict(done, id=snippet_id, explanation_url=_explanation_url(snippet_id), cached=True)
+        return
+    
+    code_parts = []
+    try:
+        async for event in _stream_field(
+            model, prompts.code_prompt(request.description, request.language), "code", code_parts, "code"
+        ):
+            yield event
+    except Exception as e:
+        logger.error(f"Model streaming error: {e}")
+        yield {"type": "error", "detail": str(e)}
+        return
+    
+    # The explanation is fetched separately from /code/snippets/{id}/explanation
+    code = "".join(code_parts)
+    saved = await get_write_queue().submit(
+        "INSERT INTO code_snippets (title, language, code, preview) VALUES (?, ?, ?, ?)",
+        (title, request.language, code, truncate_text(code, PREVIEW_LENGTH))
+    )
+    snippet_id = await saved
+    if not bypass_cache:
+        await get_cache().set(cache_key, "code", {"code": code, "snippet_id": snippet_id})
+    yield dict(done, id=snippet_id, explanation_url=_explanation_url(snippet_id), cached=False)
+
+def _shared_code_events(request, model, bypass_cache=False, refresh=False):
+    return streams.subscribe(
+        (_code_key(request), bypass_cache),
+        lambda: _code_events(request, model, bypass_cache, refresh)
+    )
+
+@app.post("/code/generate/stream")
+async def generate_code_stream(request: CodeRequest, bypass_cache: bool = False, refresh: bool = False):
+    model = llm.get_model()
+    
+    async def events():
+        if model is None:
+            yield _sse(NOT_CONFIGURED_EVENT)
+            return
+        async for event in _shared_code_events(request, model, bypass_cache, refresh):
+            yield _sse(event)
+    
+    return _sse_response(events())
+
+# Background job routes
+# Job kind -> request model validating its params
+JOB_REQUESTS = {
+    "blog": BlogRequest,
+    "code": CodeRequest,
+}
+
+async def _run_streamed(events, progress):
+    # Relay token events to the job's watchers; the job result is the done event plus the full text
+    parts = {}
+    async for event in events:
+        if event["type"] == "token":
+            parts.setdefault(event["field"], []).append(event["text"])
+            progress(event["field"], event["text"])
+        elif event["type"] == "error":
+            raise RuntimeError(event["detail"])
+        elif event["type"] == "done":
+            result = {key: value for key, value in event.items() if key != "type"}
+            result.update({field: "".join(chunks) for field, chunks in parts.items()})
+            return result
+    raise RuntimeError("Generation ended without a result")
+
+async def _blog_job(params, progress):
+    request = BlogRequest(**params)
+    model = llm.get_model()
+    if model is None:
+        # The regular endpoint answers with its fallback content
+        return await generate_blog(request)
+    try:
+        return await _run_streamed(_shared_blog_events(request, model), progress)
+    except Exception as e:
+        logger.error(f"Model API error: {e}")
+        return _blog_fallback(request)
+
+async def _code_job(params, progress):
+    request = CodeRequest(**params)
+    model = llm.get_model()
+    if model is None:
+        return await generate_code(request)
+    try:
+        return await _run_streamed(_shared_code_events(request, model), progress)
+    except Exception as e:
+        logger.error(f"Model API error: {e}")
+        return _code_fallback(request, prompts.snippet_title(request.description))
+
+# Job kind -> handler; jobs stream so /jobs/{id}/stream can relay tokens as they arrive,
+# and identical jobs running together share one model stream
+JOB_HANDLERS = {
+    "blog": _blog_job,
+    "code": _code_job,
+}
+
+# Upper bound for GET /jobs/{id}?wait= long polling (seconds)
+MAX_JOB_WAIT = 30
+
+class JobRequest(BaseModel):
+    kind: Literal["blog", "code"]
+    params: dict = Field(default_factory=dict)
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    try:
+        params = JOB_REQUESTS[request.kind](**request.params).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    try:
+        return await get_jobs().submit(request.kind, params)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=MAX_JOB_WAIT)):
+    """Job status and result; wait > 0 long-polls until the job finishes"""
+    try:
+        if wait:
+            job = await get_jobs().wait(job_id, wait)
+        else:
+            job = await get_jobs().get(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Server-sent job snapshots on every status change until the job finishes,
+    with {"type": "token"} events carrying partial output while it runs"""
+    if await get_jobs().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        async for job in get_jobs().watch(job_id):
+            yield _sse(job)
+    
+    return _sse_response(events())
+
+# Search routes
+# Full-text search sources: kind -> (FTS table, content table, title column, time column)
+SEARCH_SOURCES = {
+    "blogs": ("blog_search", "blog_content", "topic", "created_at"),
+    "snippets": ("snippet_search", "code_snippets", "title", "created_at"),
+    "chat": ("chat_search", "chat_history", "user_message", "timestamp"),
+}
+
+def _fts_query(text):
+    # Quote every term so user input can't trip FTS5 query syntax; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+@app.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    kind: Literal["all", "blogs", "snippets", "chat"] = "all",
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    match = _fts_query(q)
+    if not match:
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    
+    kinds = list(SEARCH_SOURCES) if kind == "all" else [kind]
+    selects = []
+    for source in kinds:
+        fts, table, title, time_column = SEARCH_SOURCES[source]
+        selects.append(f"""
+            SELECT '{source}' AS kind, t.id AS id, substr(t.{title}, 1, 100) AS title,
+                   snippet({fts}, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+                   t.{time_column} AS created_at, bm25({fts}) AS score
+            FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+            WHERE {fts} MATCH ?
+        """)
+    
+    try:
+        # bm25 is lower-is-better, so page ascending on (score, kind, id)
+        page = await get_db().fetch_page(
+            "(" + " UNION ALL ".join(selects) + ")", ["score", "kind"], limit,
+            before=cursor, params=[match] * len(kinds), descending=False
+        )
+        return {"query": q, "kind": kind, "results": page["items"], "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.error(f"Search failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Enhanced E-commerce Web Developer Agent routes
@@ -0,0 +1,255 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(table, columns):
+    """Build a step that adds columns missing from databases created by older schemas"""
+    def step(conn):
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    return step
+
+
+# Sort rank for todo priorities (high first); shared by the expression index
+# below and the /todos query so SQLite can match them.
+TODO_PRIORITY_RANK = "(CASE priority WHEN 'high' THEN 3 WHEN 'medium' THEN 2 WHEN 'low' THEN 1 ELSE 0 END)"
+
+# Length of the stored list previews (matches utils.truncate_text)
+PREVIEW_LENGTH = 200
+
+
+def _preview_sql(column):
+    return f"CASE WHEN length({column}) > {PREVIEW_LENGTH} THEN substr({column}, 1, {PREVIEW_LENGTH}) || '...' ELSE {column} END"
+
+
+def _fts_index(name, table, columns):
+    """Steps for an external-content FTS5 index kept in sync with its table by triggers"""
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({column_list}, content='{table}', content_rowid='id')",
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {name}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {name}({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {name}({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {name}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+        ''',
+        # Index rows written before the triggers existed
+        f"INSERT INTO {name}({name}) VALUES ('rebuild')",
+    ]
+
+
+# Ordered list of (version, name, steps). A step is either a SQL string or a
+# callable taking the connection. Never edit an applied migration - append a new one.
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            completed BOOLEAN NOT NULL DEFAULT 0,
+            priority TEXT DEFAULT 'medium',
+            category TEXT DEFAULT 'general',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            reminder_time TIMESTAMP NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            agent_type TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS blog_content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            content TEXT NOT NULL,
+            word_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS code_snippets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            language TEXT NOT NULL,
+            code TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # Databases created by the old Database.initialize() lack these columns
+    (2, "reconcile legacy columns", [
+        _add_missing_columns("todos", [
+            ("priority", "TEXT DEFAULT 'medium'"),
+            ("category", "TEXT DEFAULT 'general'"),
+        ]),
+        _add_missing_columns("reminders", [("is_active", "BOOLEAN DEFAULT 1")]),
+        _add_missing_columns("task_history", [("agent_type", "TEXT NOT NULL DEFAULT 'system'")]),
+        _add_missing_columns("blog_content", [("word_count", "INTEGER")]),
+    ]),
+    # INTEGER PRIMARY KEY is the rowid, so each index is implicitly (column, id)
+    (3, "indexes for time-ordered listings", [
+        "CREATE INDEX IF NOT EXISTS idx_todos_created_at ON todos(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_todos_filters ON todos(completed, priority, category)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp ON chat_history(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_blog_content_created_at ON blog_content(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_code_snippets_created_at ON code_snippets(created_at)",
+    ]),
+    (4, "indexes for todo filters and sorting", [
+        "CREATE INDEX IF NOT EXISTS idx_todos_completed_created_at ON todos(completed, created_at)",
+        f"CREATE INDEX IF NOT EXISTS idx_todos_priority_rank ON todos({TODO_PRIORITY_RANK}, created_at)",
+    ]),
+    # Short previews so list views don't have to ship full bodies
+    (5, "preview columns for blogs and snippets", [
+        _add_missing_columns("blog_content", [("preview", "TEXT")]),
+        _add_missing_columns("code_snippets", [("preview", "TEXT")]),
+        f"UPDATE blog_content SET preview = {_preview_sql('content')} WHERE preview IS NULL",
+        f"UPDATE code_snippets SET preview = {_preview_sql('code')} WHERE preview IS NULL",
+    ]),
+    (6, "full-text search indexes", [
+        *_fts_index("blog_search", "blog_content", ["topic", "content"]),
+        *_fts_index("snippet_search", "code_snippets", ["title", "description", "code"]),
+        *_fts_index("chat_search", "chat_history", ["user_message", "bot_response"]),
+    ]),
+    (7, "persistent LLM response cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            agent TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at)",
+    ]),
+    (8, "background generation jobs", [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs(status, created_at)",
+    ]),
+    # Existing chat rows keep a NULL session and are never pulled into a prompt
+    (9, "chat sessions and rolling summaries", [
+        _add_missing_columns("chat_history", [("session_id", "TEXT")]),
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history(session_id, timestamp)",
+        '''
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            summarized_through INTEGER NOT NULL,
+            turns INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (10, "per-call model usage accounting", [
+        '''
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent TEXT NOT NULL,
+            provider TEXT,
+            model TEXT,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            response_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms REAL NOT NULL DEFAULT 0,
+            cached INTEGER NOT NULL DEFAULT 0,
+            outcome TEXT NOT NULL,
+            cost_usd REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_llm_usage_agent_created_at ON llm_usage(agent, created_at)",
+    ]),
+]
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a fresh database)"""
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations in order, each in its own transaction"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, name, steps in sorted(migrations, key=lambda m: m[0]):
+        # Take the write lock before re-checking so concurrent workers don't race
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Applied migration {version}: {name}")
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,126 @@
+# Prompt templates shared by the regular and streaming agent endpoints
+
+# Map length to word count
+BLOG_LENGTHS = {
+    "Short": "300-400 words",
+    "Medium": "600-800 words",
+    "Long": "1200-1500 words"
+}
+
+
+def blog_prompt(topic, length, style):
+    """Prompt for the Content Creator agent"""
+    word_count_instruction = BLOG_LENGTHS.get(length, "600-800 words")
+
+    # Create style-specific prompts
+    style_prompts = {
+        "informative": f"Write a comprehensive, informative blog post about {topic}. Use a professional tone with clear explanations and factual information.",
+        "casual": f"Write a casual, friendly blog post about {topic}. Use a conversational tone as if talking to a friend.",
+        "professional": f"Write a professional, business-oriented blog post about {topic}. Use formal language suitable for corporate audiences.",
+        "creative": f"Write a creative, engaging blog post about {topic}. Use storytelling elements and imaginative language."
+    }
+
+    return f"""
+    {style_prompts.get(style, style_prompts['informative'])}
+
+    Requirements:
+    - Length: {word_count_instruction}
+    - Include a compelling title
+    - Use proper headings and structure with markdown formatting
+    - Make it engaging and well-researched
+    - Include practical insights or actionable advice
+    - Use bullet points and numbered lists where appropriate
+    - Add a conclusion that summarizes key points
+
+    Topic: {topic}
+
+    Please format the response with proper markdown headers (# ## ###) and structure.
+    """
+
+
+def _transcript(turns):
+    return "\n".join(
+        f"    User: {turn['user_message']}\n    Assistant: {turn['bot_response']}" for turn in turns
+    )
+
+
+def chat_prompt(message, summary=None, turns=()):
+    """Prompt for the AI Assistant agent, with optional conversation context"""
+    context = ""
+    if summary:
+        context += f"""
+    Summary of the earlier conversation:
+    {summary}
+"""
+    if turns:
+        context += f"""
+    Recent conversation:
+{_transcript(turns)}
+"""
+    return f"""
+    You are a helpful AI assistant. Respond to this message in a friendly and helpful way:
+{context}
+    User: {message}
+
+    Keep your response concise but informative.
+    """
+
+
+def summary_prompt(summary, turns, max_words):
+    """Prompt folding older chat turns into the running conversation summary"""
+    previous = summary or "(none yet)"
+    return f"""
+    Update the running summary of a conversation between a user and an AI assistant.
+
+    Current summary:
+    {previous}
+
+    New turns to fold in:
+{_transcript(turns)}
+
+    Write the updated summary in at most {max_words} words. Keep facts, names,
+    preferences and open questions the assistant may need later; drop small talk.
+    Reply with the summary only.
+    """
+
+
+def code_prompt(description, language):
+    """Prompt for the Code Generator agent"""
+    return f"""
+    Generate {language} code for the following requirement:
+    {description}
+
+    Requirements:
+    - Write clean, well-commented code
+    - Include error handling where appropriate
+    - Add example usage if applicable
+    - Follow best practices for {language}
+    - Make the code production-ready
+    - Include docstrings/comments explaining the functionality
+    - Use modern {language} features and conventions
+
+    Provide only the code with comments, no additional explanation outside the code.
+    """
+
+
+def explanation_prompt(code, language):
+    """Prompt asking the model to explain generated code"""
+    return f"""
+    Explain this {language} code in simple terms:
+
+    {code}
+
+    Provide:
+    1. What the code does (main purpose)
+    2. How it works (step by step explanation)
+    3. Key features or concepts used
+    4. When and why to use this code
+    5. Any important notes about the implementation
+
+    Make the explanation clear and educational for developers of all levels.
+    """
+
+
+def snippet_title(description):
+    """Short title stored with a generated code snippet"""
+    return description[:50] + "..." if len(description) > 50 else description
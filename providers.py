@@ -0,0 +1,195 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+
+from utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Stub backend tuning: time to first token (ms) and its spread, output size and speed
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "800"))
+LLM_STUB_JITTER_MS = float(os.getenv("LLM_STUB_JITTER_MS", "200"))
+LLM_STUB_DISTRIBUTION = os.getenv("LLM_STUB_DISTRIBUTION", "normal")
+LLM_STUB_TOKENS = int(os.getenv("LLM_STUB_TOKENS", "200"))
+LLM_STUB_TOKENS_PER_SEC = float(os.getenv("LLM_STUB_TOKENS_PER_SEC", "50"))
+# Spread of the gap between tokens (ms), drawn from LLM_STUB_DISTRIBUTION around 1/TOKENS_PER_SEC
+LLM_STUB_TOKEN_JITTER_MS = float(os.getenv("LLM_STUB_TOKEN_JITTER_MS", "0"))
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+
+# Gemini list prices in USD per million prompt / response tokens, for usage cost estimates
+GEMINI_PRICE_INPUT_PER_MTOK = float(os.getenv("GEMINI_PRICE_INPUT_PER_MTOK", "0.10"))
+GEMINI_PRICE_OUTPUT_PER_MTOK = float(os.getenv("GEMINI_PRICE_OUTPUT_PER_MTOK", "0.40"))
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+_WORDS = (
+    "agent", "system", "data", "model", "request", "response", "design", "cache",
+    "latency", "queue", "service", "update", "user", "value", "result", "simple",
+    "fast", "reliable", "example", "feature", "process", "output", "input", "state",
+)
+
+
+class Provider:
+    """Blocking text-generation backend; llm runs these calls on its executor"""
+
+    name = "base"
+    # USD per million prompt / response tokens
+    price_input_per_mtok = 0.0
+    price_output_per_mtok = 0.0
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    @property
+    def label(self):
+        """Human-readable model name returned by the agent endpoints"""
+        return self.model_name
+
+    def generate(self, prompt):
+        """Full response text for prompt"""
+        raise NotImplementedError
+
+    def complete(self, prompt):
+        """(text, prompt_tokens, response_tokens); counts are estimated unless the backend reports them"""
+        text = self.generate(prompt)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+
+    def cost(self, prompt_tokens, response_tokens):
+        """Estimated USD cost of one call"""
+        return (prompt_tokens * self.price_input_per_mtok
+                + response_tokens * self.price_output_per_mtok) / 1_000_000
+
+    def stream(self, prompt):
+        """Iterate response text chunks for prompt"""
+        yield self.generate(prompt)
+
+
+class GeminiProvider(Provider):
+    """Google Gemini through google-generativeai"""
+
+    name = "gemini"
+    price_input_per_mtok = GEMINI_PRICE_INPUT_PER_MTOK
+    price_output_per_mtok = GEMINI_PRICE_OUTPUT_PER_MTOK
+
+    def __init__(self, model_name, api_key):
+        super().__init__(model_name)
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name)
+
+    @property
+    def label(self):
+        if self.model_name.startswith("gemini-2.0-flash"):
+            return "Gemini 2.0 Flash"
+        return self.model_name
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+    def complete(self, prompt):
+        response = self._model.generate_content(prompt)
+        text = response.text
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        response_tokens = getattr(usage, "candidates_token_count", None)
+        return (
+            text,
+            prompt_tokens if isinstance(prompt_tokens, int) else estimate_tokens(prompt),
+            response_tokens if isinstance(response_tokens, int) else estimate_tokens(text),
+        )
+
+    def stream(self, prompt):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubUpstreamError(Exception):
+    """Injected transient failure; code 503 makes the governor treat it as retryable"""
+
+    code = 503
+
+
+class StubProvider(Provider):
+    """Offline backend with deterministic text and configurable latency, for load tests and CI"""
+
+    name = "stub"
+
+    def __init__(self, model_name="stub", latency_ms=LLM_STUB_LATENCY_MS, jitter_ms=LLM_STUB_JITTER_MS,
+                 distribution=LLM_STUB_DISTRIBUTION, tokens=LLM_STUB_TOKENS,
+                 tokens_per_sec=LLM_STUB_TOKENS_PER_SEC, token_jitter_ms=LLM_STUB_TOKEN_JITTER_MS,
+                 error_rate=LLM_STUB_ERROR_RATE, seed=LLM_STUB_SEED):
+        super().__init__(model_name)
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown stub latency distribution: {distribution}")
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.distribution = distribution
+        self.tokens = tokens
+        self.tokens_per_sec = tokens_per_sec
+        self.token_jitter = token_jitter_ms / 1000
+        self.error_rate = error_rate
+        # Timing draws are seeded too so benchmark runs are repeatable; shared across threads
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def label(self):
+        return f"Stub ({self.model_name})"
+
+    def _sample(self, mean, spread):
+        # Caller holds _rng_lock
+        if self.distribution == "uniform":
+            value = self._rng.uniform(mean - spread, mean + spread)
+        elif self.distribution == "normal":
+            value = self._rng.gauss(mean, spread)
+        elif self.distribution == "lognormal" and mean > 0:
+            # mean is the median, spread/mean the log-space spread
+            value = self._rng.lognormvariate(0, spread / mean) * mean
+        else:
+            value = mean
+        return max(0.0, value)
+
+    def _first_token_delay(self):
+        with self._rng_lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                raise StubUpstreamError("Injected stub upstream failure")
+            return self._sample(self.latency, self.jitter)
+
+    def _token_interval(self):
+        if self.tokens_per_sec <= 0:
+            return 0.0
+        with self._rng_lock:
+            return self._sample(1 / self.tokens_per_sec, self.token_jitter)
+
+    def _words(self, prompt):
+        # Same prompt, same text: seeded from the prompt itself
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        rng = random.Random(int(digest, 16))
+        words = [rng.choice(_WORDS) for _ in range(self.tokens)]
+        return [f"# Stub response {digest[:8]}\n\n"] + [word + " " for word in words]
+
+    def generate(self, prompt):
+        delay = self._first_token_delay()
+        words = self._words(prompt)
+        delay += sum(self._token_interval() for _ in words)
+        time.sleep(delay)
+        return "".join(words).rstrip()
+
+    def stream(self, prompt):
+        time.sleep(self._first_token_delay())
+        for word in self._words(prompt):
+            interval = self._token_interval()
+            if interval:
+                time.sleep(interval)
+            yield word
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+}
@@ -19,6 +19,10 @@ GEMINI_API_KEY=your_gemini_api_key_here
 # Weather API Key (Optional - for real weather data)
 # Get free key from: https://openweathermap.org/api
 WEATHER_API_KEY=your_weather_api_key_here
+
+# Admin token (Optional - enables admin routes such as clearing the weather cache)
+# Admin routes stay disabled until this is set; send it as the X-Admin-Token header
+# ADMIN_TOKEN=choose_a_long_random_secret
 """)
             print("✅ Created .env file")
     
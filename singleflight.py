@@ -0,0 +1,162 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _mark_retrieved(task):
+    # Every waiter may have gone away; don't warn about an unobserved failure
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one upstream call"""
+
+    def __init__(self):
+        # key -> [task, waiter count]; only touched from the event loop
+        self._flights = {}
+        self._stats = {
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "failures": 0,
+            "cancelled": 0,
+        }
+
+    async def run(self, key, fn):
+        """Await fn() once per key; callers arriving while it runs share its result"""
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.create_task(fn())
+            task.add_done_callback(_mark_retrieved)
+            task.add_done_callback(lambda t: self._finish(key, t))
+            flight = self._flights[key] = [task, 0]
+            self._stats["upstream_calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            # Shielded so one caller going away doesn't cancel the call for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and flight[1] == 1:
+                # Last interested caller left; stop the upstream call
+                task.cancel()
+            raise
+        finally:
+            flight[1] -= 1
+
+    def _finish(self, key, task):
+        if self._flights.get(key, [None])[0] is task:
+            del self._flights[key]
+        if task.cancelled():
+            self._stats["cancelled"] += 1
+        elif task.exception() is not None:
+            self._stats["failures"] += 1
+
+    def stats(self):
+        """Upstream calls made versus calls saved by coalescing"""
+        snapshot = dict(self._stats)
+        snapshot["in_flight"] = len(self._flights)
+        snapshot["saved_calls"] = snapshot["coalesced"]
+        requests = snapshot["upstream_calls"] + snapshot["coalesced"]
+        snapshot["coalesce_rate"] = round(snapshot["coalesced"] / requests * 100, 1) if requests else 0
+        return snapshot
+
+
+class _StreamFlight:
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        # Replaced on every change, so each waiter sees the change exactly once
+        self.changed = asyncio.Event()
+
+    def publish(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SharedStream:
+    """Streaming counterpart of SingleFlight: one producer per key, its events fanned out
+
+    Subscribers joining while the producer runs get every event from the start, so each
+    one sees the complete stream.
+    """
+
+    def __init__(self):
+        # key -> _StreamFlight; only touched from the event loop
+        self._flights = {}
+        self._stats = {
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "failures": 0,
+            "cancelled": 0,
+        }
+
+    async def subscribe(self, key, produce):
+        """Yield the events of produce() (an async iterator factory), run once per key"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _StreamFlight()
+            flight.task = asyncio.create_task(self._drain(key, flight, produce))
+            self._stats["upstream_calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        flight.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                if sent < len(flight.events):
+                    event = flight.events[sent]
+                    sent += 1
+                    yield event
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.finished:
+                # Last subscriber left; stop the upstream stream, and let newcomers start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _drain(self, key, flight, produce):
+        events = produce()
+        try:
+            async for event in events:
+                flight.events.append(event)
+                flight.publish()
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            flight.error = asyncio.CancelledError()
+            # Let the producer run its own cleanup now rather than at garbage collection
+            try:
+                await events.aclose()
+            except Exception:
+                pass
+        except Exception as e:
+            self._stats["failures"] += 1
+            flight.error = e
+        finally:
+            flight.finished = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish()
+
+    def stats(self):
+        """Upstream streams opened versus subscribers that joined one already running"""
+        snapshot = dict(self._stats)
+        snapshot["in_flight"] = len(self._flights)
+        requests = snapshot["upstream_calls"] + snapshot["coalesced"]
+        snapshot["coalesce_rate"] = round(snapshot["coalesced"] / requests * 100, 1) if requests else 0
+        return snapshot
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so they are fixed before any app module loads:
+# a throwaway database, the offline stub model and no background weather refresh
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="agent-tests-"), "test.db")
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ.setdefault("LLM_STUB_LATENCY_MS", "1500")
+os.environ.setdefault("LLM_STUB_JITTER_MS", "0")
+os.environ.setdefault("LLM_STUB_TOKENS_PER_SEC", "0")
+os.environ.setdefault("LLM_STUB_ERROR_RATE", "0")
+# Let 50 concurrent generations through the governor instead of queueing them
+os.environ.setdefault("LLM_RATE_PER_MIN", "6000")
+os.environ.setdefault("LLM_BURST", "100")
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "64")
+os.environ.setdefault("LLM_THREADS", "64")
+os.environ["WEATHER_REFRESH_BUDGET"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
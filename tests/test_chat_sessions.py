@@ -0,0 +1,54 @@
+import asyncio
+import os
+import re
+import tempfile
+
+import llm
+from chat_sessions import ChatSessions
+from database import AsyncDatabase, ConnectionPool
+from migrations import migrate
+
+SESSION = "session-1"
+
+
+def test_failed_folds_are_retried_without_skipping_turns(monkeypatch):
+    folded = []
+    calls = {"count": 0}
+
+    async def fake_generate(model, prompt, agent="other"):
+        calls["count"] += 1
+        if calls["count"] <= 3:
+            raise RuntimeError("summary model unavailable")
+        # Only the turns being folded carry msgN markers; the summary itself does not
+        folded.extend(int(n) for n in re.findall(r"msg(\d+)\b", prompt))
+        return f"summary {calls['count']}"
+
+    monkeypatch.setattr(llm, "generate_content", fake_generate)
+
+    async def scenario():
+        pool = ConnectionPool(os.path.join(tempfile.mkdtemp(), "chat.db"), readers=1)
+        pool.write(migrate)
+        db = AsyncDatabase(pool, max_workers=2)
+        sessions = ChatSessions(db, max_turns=3, token_budget=1000, fold_batch=2)
+        try:
+            for i in range(20):
+                await db.execute(
+                    "INSERT INTO chat_history (user_message, bot_response, session_id) VALUES (?, ?, ?)",
+                    (f"msg{i}", f"reply to turn {i}", SESSION)
+                )
+                _, context = await sessions.prompt(SESSION, "next")
+                if context["fold_due"]:
+                    sessions.schedule_fold(SESSION, model=None)
+                    await asyncio.gather(*list(sessions._tasks))
+            return await sessions.session(SESSION), sessions.stats()
+        finally:
+            pool.close()
+
+    session, stats = asyncio.run(scenario())
+
+    assert stats["fold_failures"] == 3
+    summarized = session["summarized_turns"]
+    # Every summarized turn went through a successful summary call, oldest first, none skipped
+    assert folded == list(range(summarized))
+    # After the failures the backlog caught up to the turns just outside the window
+    assert summarized >= 20 - 3 - 2
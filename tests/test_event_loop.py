@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import httpx
+
+import main
+from providers import LLM_STUB_LATENCY_MS
+
+SLOW_GENERATIONS = 50
+# /health must answer well inside one stub generation while the loop is shared with them
+HEALTH_LATENCY_LIMIT = 0.25
+
+
+async def _health_latencies(client, samples):
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+def test_health_stays_fast_while_slow_generations_are_in_flight():
+    async def scenario():
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+                baseline = await _health_latencies(client, 5)
+
+                started = time.perf_counter()
+                generations = [
+                    asyncio.create_task(client.post(
+                        "/generate/blog", params={"bypass_cache": True},
+                        json={"topic": f"Topic {i}", "length": "Short", "style": "casual"}
+                    ))
+                    for i in range(SLOW_GENERATIONS)
+                ]
+                await asyncio.sleep(0.2)
+                under_load = await _health_latencies(client, 20)
+                assert not any(task.done() for task in generations), "generations finished before /health was sampled"
+
+                responses = await asyncio.gather(*generations)
+                elapsed = time.perf_counter() - started
+        return baseline, under_load, responses, elapsed
+
+    baseline, under_load, responses, elapsed = asyncio.run(scenario())
+
+    for response in responses:
+        assert response.status_code == 200
+        assert "note" not in response.json(), "generation fell back instead of calling the model"
+    # All 50 really were slow model calls, run concurrently rather than one after another
+    assert elapsed >= LLM_STUB_LATENCY_MS / 1000
+    assert elapsed < SLOW_GENERATIONS * LLM_STUB_LATENCY_MS / 1000 / 4
+    assert max(under_load) < HEALTH_LATENCY_LIMIT, (baseline, under_load)
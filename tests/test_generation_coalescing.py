@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import httpx
+
+import main
+
+
+def _sse_events(body):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_identical_jobs_and_streams_share_one_model_stream():
+    async def scenario():
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+                params = {"topic": "Coalesced jobs", "length": "Short", "style": "casual"}
+                submitted = await asyncio.gather(*[
+                    client.post("/jobs", json={"kind": "blog", "params": params}) for _ in range(4)
+                ])
+                jobs = await asyncio.gather(*[
+                    client.get(f"/jobs/{response.json()['id']}", params={"wait": 10})
+                    for response in submitted
+                ])
+
+                streamed = await asyncio.gather(*[
+                    client.post(
+                        "/generate/blog/stream", params={"bypass_cache": True},
+                        json={"topic": "Coalesced streams", "length": "Short", "style": "casual"}
+                    )
+                    for _ in range(3)
+                ])
+
+                rows = await main.get_db().fetch_one(
+                    "SELECT COUNT(*) AS n FROM blog_content WHERE topic = ?", ("Coalesced jobs",)
+                )
+                stats = main.streams.stats()
+        return [job.json() for job in jobs], [_sse_events(r.text) for r in streamed], rows["n"], stats
+
+    jobs, streams, rows, stats = asyncio.run(scenario())
+
+    assert [job["status"] for job in jobs] == ["succeeded"] * 4
+    assert len({job["result"]["content"] for job in jobs}) == 1
+    assert rows == 1
+    assert [events[-1]["type"] for events in streams] == ["done"] * 3
+    assert len({"".join(e["text"] for e in events if e["type"] == "token") for events in streams}) == 1
+    # One model stream for the four jobs and one for the three SSE clients
+    assert stats["upstream_calls"] == 2
+    assert stats["coalesced"] == 5
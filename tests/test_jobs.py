@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from database import AsyncDatabase, ConnectionPool
+from jobs import JobQueue
+from migrations import migrate
+
+
+def test_worker_survives_database_errors():
+    async def echo(params, progress):
+        progress("text", params["text"])
+        return {"text": params["text"]}
+
+    async def scenario():
+        pool = ConnectionPool(os.path.join(tempfile.mkdtemp(), "jobs.db"), readers=1)
+        pool.write(migrate)
+        db = AsyncDatabase(pool, max_workers=2)
+        queue = JobQueue(db, {"echo": echo}, workers=1)
+
+        execute = db.execute
+        failures = {"left": 1}
+
+        async def flaky_execute(query, params=()):
+            if "status = 'running'" in query and failures["left"]:
+                failures["left"] -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return await execute(query, params)
+
+        db.execute = flaky_execute
+        await queue.start()
+        try:
+            first = await queue.submit("echo", {"text": "one"})
+            second = await queue.submit("echo", {"text": "two"})
+            first = await queue.wait(first["id"], 5)
+            second = await queue.wait(second["id"], 5)
+            return first, second, queue.stats()
+        finally:
+            await queue.stop()
+            pool.close()
+
+    first, second, stats = asyncio.run(scenario())
+
+    assert first["status"] == "failed"
+    assert "database is locked" in first["error"]
+    # The single worker kept going after the error
+    assert second["status"] == "succeeded"
+    assert second["result"] == {"text": "two"}
+    assert stats["workers"] == 1
+    assert stats["worker_errors"] == 1
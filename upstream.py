@@ -0,0 +1,291 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upstream budget: sustained requests per minute, burst size and concurrent calls
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", "60"))
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Longest a call may wait for a rate token and a concurrency slot (seconds)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Retries for transient errors, with full-jitter exponential backoff (milliseconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_MS = int(os.getenv("LLM_RETRY_BASE_MS", "500"))
+LLM_RETRY_MAX_MS = int(os.getenv("LLM_RETRY_MAX_MS", "8000"))
+# Consecutive transient failures that open the circuit, and how long it stays open (seconds)
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# google.api_core exception names for throttling and server-side failures
+RETRYABLE_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "Aborted",
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the model: circuit open or no capacity in time"""
+
+
+def is_retryable(error):
+    """Throttling, timeouts and 5xx responses are worth retrying; bad requests are not"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to capacity; one token per upstream call"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, deadline):
+        """Take a token, sleeping until one is available or the monotonic deadline passes"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise UpstreamUnavailable("Upstream rate limit reached; try again shortly")
+            await asyncio.sleep(wait)
+
+    def available(self):
+        self._refill()
+        return round(self.tokens, 2)
+
+
+class CircuitBreaker:
+    """Opens after repeated transient failures, then lets one probe call through after a cooldown"""
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probing = False
+
+    def retry_after(self):
+        if self.state != "open":
+            return 0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def check(self):
+        """Raise UpstreamUnavailable while the circuit is open"""
+        if self.state == "open":
+            if self.retry_after() > 0:
+                raise UpstreamUnavailable(
+                    f"Upstream unavailable; circuit open for another {self.retry_after():.1f}s"
+                )
+            self.state = "half_open"
+        if self.state == "half_open" and self._probing:
+            raise UpstreamUnavailable("Upstream recovering; probe call in flight")
+
+    def acquire(self):
+        """Check the circuit; returns True if this call is the half-open probe"""
+        self.check()
+        if self.state == "half_open":
+            self._probing = True
+            return True
+        return False
+
+    def release(self):
+        # A probe that ended without an outcome (cancelled) frees the slot for the next one
+        self._probing = False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Upstream recovered; circuit closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"Circuit opened after {self.failures} consecutive upstream failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "times_opened": self.times_opened,
+        }
+
+
+class UpstreamGovernor:
+    """Rate limit, concurrency cap, retry and circuit breaker around every model call"""
+
+    def __init__(self, rate_per_min=LLM_RATE_PER_MIN, burst=LLM_BURST,
+                 max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, retry_base_ms=LLM_RETRY_BASE_MS,
+                 retry_max_ms=LLM_RETRY_MAX_MS, breaker_threshold=LLM_BREAKER_THRESHOLD,
+                 breaker_cooldown=LLM_BREAKER_COOLDOWN):
+        self.bucket = TokenBucket(rate_per_min / 60, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._stats = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rejected": 0,
+            "throttled": 0,
+        }
+
+    @asynccontextmanager
+    async def _slot(self):
+        try:
+            # Fail fast before queuing behind the limiter
+            self.breaker.check()
+        except UpstreamUnavailable:
+            self._stats["rejected"] += 1
+            raise
+
+        deadline = time.monotonic() + self.queue_timeout
+        self._waiting += 1
+        try:
+            await self.bucket.acquire(deadline)
+            await asyncio.wait_for(self._semaphore.acquire(), max(0, deadline - time.monotonic()))
+        except (UpstreamUnavailable, asyncio.TimeoutError):
+            self._stats["throttled"] += 1
+            raise UpstreamUnavailable("Timed out waiting for upstream capacity")
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        try:
+            try:
+                probe = self.breaker.acquire()
+            except UpstreamUnavailable:
+                self._stats["rejected"] += 1
+                raise
+            try:
+                yield
+            finally:
+                if probe:
+                    self.breaker.release()
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    def _should_retry(self, error, attempt):
+        """Record a failed attempt; True if it should be retried"""
+        if not is_retryable(error):
+            # The upstream answered; a bad request says nothing about its health
+            self.breaker.record_success()
+            self._stats["failed"] += 1
+            return False
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.state == "open":
+            self._stats["failed"] += 1
+            return False
+        self._stats["retries"] += 1
+        logger.warning(f"Transient upstream error (attempt {attempt + 1}), retrying: {error}")
+        return True
+
+    async def _backoff(self, attempt):
+        # Full jitter keeps retrying clients from synchronizing
+        await asyncio.sleep(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt)))
+
+    async def call(self, fn):
+        """Await fn() under the limits, retrying transient failures"""
+        self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            async with self._slot():
+                try:
+                    result = await fn()
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                else:
+                    self.breaker.record_success()
+                    self._stats["succeeded"] += 1
+                    return result
+            await self._backoff(attempt)
+            attempt += 1
+
+    async def stream(self, open_stream):
+        """Async-iterate open_stream() under the limits; retries only before the first item"""
+        self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            started = False
+            async with self._slot():
+                try:
+                    async for item in open_stream():
+                        started = True
+                        yield item
+                except Exception as e:
+                    if started:
+                        # Part of the response already went out; don't replay it
+                        if is_retryable(e):
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+                        self._stats["failed"] += 1
+                        raise
+                    if not self._should_retry(e, attempt):
+                        raise
+                else:
+                    self.breaker.record_success()
+                    self._stats["succeeded"] += 1
+                    return
+            await self._backoff(attempt)
+            attempt += 1
+
+    def stats(self):
+        """Limiter, retry and circuit breaker state"""
+        snapshot = dict(self._stats)
+        snapshot.update(
+            active=self._active,
+            waiting=self._waiting,
+            max_concurrency=self.max_concurrency,
+            tokens_available=self.bucket.available(),
+            rate_per_min=round(self.bucket.rate * 60, 2),
+            burst=self.bucket.capacity,
+            max_retries=self.max_retries,
+            circuit=self.breaker.stats(),
+        )
+        return snapshot
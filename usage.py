@@ -0,0 +1,77 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UsageRecorder:
+    """Per-call model usage rows, written through the write-behind queue in group commits"""
+
+    def __init__(self, db, write_queue):
+        self.db = db
+        self.write_queue = write_queue
+        self._stats = {"recorded": 0, "dropped": 0}
+
+    async def record(self, agent, provider, model, prompt_tokens=0, response_tokens=0,
+                     latency_ms=0.0, cached=False, outcome="ok", cost=0.0):
+        """Queue one usage row; accounting problems never fail the request"""
+        try:
+            await self.write_queue.submit(
+                """
+                INSERT INTO llm_usage
+                    (agent, provider, model, prompt_tokens, response_tokens, latency_ms, cached, outcome, cost_usd)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (agent, provider, model, prompt_tokens, response_tokens,
+                 round(latency_ms, 1), int(cached), outcome, cost)
+            )
+            self._stats["recorded"] += 1
+        except Exception as e:
+            self._stats["dropped"] += 1
+            logger.error(f"Usage record for {agent} dropped: {e}")
+
+    async def rollup(self, days):
+        """Per-agent and per-agent-per-day totals over the last days (UTC)"""
+        metrics = """
+            COUNT(*) AS calls,
+            SUM(cached = 0) AS upstream_calls,
+            SUM(cached) AS cache_hits,
+            SUM(outcome != 'ok') AS errors,
+            SUM(prompt_tokens) AS prompt_tokens,
+            SUM(response_tokens) AS response_tokens,
+            ROUND(AVG(CASE WHEN cached = 0 THEN latency_ms END), 1) AS avg_latency_ms,
+            MAX(CASE WHEN cached = 0 THEN latency_ms END) AS max_latency_ms,
+            ROUND(SUM(cost_usd), 6) AS cost_usd
+        """
+        since = (f"-{days} days",)
+
+        def query(conn):
+            agents = conn.execute(
+                f"""
+                SELECT agent, {metrics} FROM llm_usage
+                WHERE created_at >= datetime('now', ?)
+                GROUP BY agent ORDER BY calls DESC
+                """,
+                since
+            ).fetchall()
+            per_day = conn.execute(
+                f"""
+                SELECT date(created_at) AS day, agent, {metrics} FROM llm_usage
+                WHERE created_at >= datetime('now', ?)
+                GROUP BY day, agent ORDER BY day DESC, calls DESC
+                """,
+                since
+            ).fetchall()
+            totals = conn.execute(
+                f"SELECT {metrics} FROM llm_usage WHERE created_at >= datetime('now', ?)",
+                since
+            ).fetchone()
+            return [dict(row) for row in agents], [dict(row) for row in per_day], dict(totals)
+
+        agents, per_day, totals = await self.db.read(query)
+        for row in agents + per_day + [totals]:
+            calls = row["calls"] or 0
+            row["cache_hit_rate"] = round((row["cache_hits"] or 0) / calls * 100, 1) if calls else 0
+        return {"days": days, "totals": totals, "agents": agents, "daily": per_day}
+
+    def stats(self):
+        return dict(self._stats)
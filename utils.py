@@ -32,3 +32,7 @@ def truncate_text(text, max_length=100):
     if len(text) <= max_length:
         return text
     return text[:max_length] + "..."
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)"""
+    return len(text or "") // 4 + 1
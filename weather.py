@@ -0,0 +1,515 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import httpx
+import numpy as np
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Cache lifetimes (seconds) for current conditions, forecasts and "not found" answers
+WEATHER_CURRENT_TTL = int(os.getenv("WEATHER_CURRENT_TTL", "600"))
+WEATHER_FORECAST_TTL = int(os.getenv("WEATHER_FORECAST_TTL", "1800"))
+# Forecast rollups live until the next 3-hour issuance, but at least this long
+WEATHER_FORECAST_MIN_TTL = int(os.getenv("WEATHER_FORECAST_MIN_TTL", "300"))
+WEATHER_NOT_FOUND_TTL = int(os.getenv("WEATHER_NOT_FOUND_TTL", "120"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "512"))
+# Upstream lookups a single batch request may run at once
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "5"))
+
+# Background refresh of the hot set: the seed locations plus the most-requested ones
+WEATHER_HOT_LOCATIONS = [
+    location.strip() for location in os.getenv(
+        "WEATHER_HOT_LOCATIONS",
+        "New York,London,Tokyo,Paris,Sydney,Dubai,Singapore,Mumbai,Berlin,Toronto"
+    ).split(",") if location.strip()
+]
+WEATHER_HOT_EXTRA = int(os.getenv("WEATHER_HOT_EXTRA", "10"))
+# Upstream calls the refresher may make per minute; 0 turns it off
+WEATHER_REFRESH_BUDGET = int(os.getenv("WEATHER_REFRESH_BUDGET", "30"))
+# Hot entries are refreshed once they expire within this many seconds
+WEATHER_REFRESH_AHEAD = int(os.getenv("WEATHER_REFRESH_AHEAD", "120"))
+WEATHER_REFRESH_INTERVAL = float(os.getenv("WEATHER_REFRESH_INTERVAL", "30"))
+# Expired hot entries are still served (marked stale) for this long while they refresh
+WEATHER_STALE_GRACE = int(os.getenv("WEATHER_STALE_GRACE", "300"))
+
+CURRENT_URL = "http://api.openweathermap.org/data/2.5/weather"
+FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+FORECAST_STEP_SECONDS = 3 * 3600
+EPOCH = date(1970, 1, 1)
+PLACEHOLDER_KEY = "your_weather_api_key_here"
+
+WEATHER_ICONS = {
+    "clear": "☀️",
+    "clouds": "☁️",
+    "rain": "🌧️",
+    "drizzle": "🌦️",
+    "thunderstorm": "⛈️",
+    "snow": "❄️",
+    "mist": "🌫️",
+    "fog": "🌫️",
+    "haze": "🌫️"
+}
+
+NOT_FOUND = {"error": "Location not found"}
+UNAVAILABLE = {"error": "Weather service unavailable"}
+NOT_CONFIGURED = {
+    "error": "Weather API key not configured",
+    "message": "Please set WEATHER_API_KEY in your .env file"
+}
+
+
+def normalize_location(location):
+    """Cache key form of a location: case- and whitespace-insensitive"""
+    return ",".join(" ".join(part.lower().split()) for part in location.split(","))
+
+
+def api_key():
+    """Configured OpenWeatherMap key, or None; read per call like the original handlers"""
+    key = os.getenv("WEATHER_API_KEY")
+    if key and key != PLACEHOLDER_KEY:
+        return key
+    return None
+
+
+class TTLCache:
+    """Bounded LRU whose entries carry their own TTL"""
+
+    def __init__(self, max_entries=WEATHER_CACHE_SIZE):
+        self.max_entries = max_entries
+        # key -> (stored_at, expires_at, value); only touched from the event loop
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "negative_hits": 0, "stale_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key, grace=0):
+        """(value, age, seconds to expiry) for a live entry, else None
+
+        Entries up to grace seconds past expiry are still returned, with a negative expiry.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        stored_at, expires_at, value = entry
+        now = time.time()
+        if expires_at + grace <= now:
+            del self._entries[key]
+            self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        if expires_at <= now:
+            self._stats["stale_hits"] += 1
+        else:
+            self._stats["negative_hits" if "error" in value else "hits"] += 1
+        return value, now - stored_at, expires_at - now
+
+    def peek(self, key):
+        """(value, stored_at, expires_at) for any stored entry, expired or not, else None;
+        not counted as a lookup"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, expires_at, value = entry
+        return value, stored_at, expires_at
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._entries[key] = (now, now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, match=None):
+        """Drop entries whose key satisfies match(key), or everything; returns the count"""
+        if match is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        keys = [key for key in self._entries if match(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["negative_hits"] + snapshot["stale_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round((lookups - snapshot["misses"]) / lookups * 100, 1) if lookups else 0
+        snapshot["entries"] = len(self._entries)
+        snapshot["max_entries"] = self.max_entries
+        return snapshot
+
+
+def format_current(data):
+    """API payload for /weather from an OpenWeatherMap current-weather response"""
+    weather_main = data['weather'][0]['main'].lower()
+    icon = WEATHER_ICONS.get(weather_main, "🌤️")
+
+    return {
+        "location": f"{data['name']}, {data['sys']['country']}",
+        "temperature": round(data['main']['temp']),
+        "feels_like": round(data['main']['feels_like']),
+        "description": data['weather'][0]['description'].title(),
+        "humidity": data['main']['humidity'],
+        "pressure": data['main']['pressure'],
+        "wind_speed": round(data['wind']['speed'] * 3.6, 1),
+        "wind_direction": data['wind'].get('deg', 0),
+        "visibility": data.get('visibility', 0) / 1000,
+        "icon": icon,
+        "sunrise": datetime.fromtimestamp(data['sys']['sunrise']).strftime("%H:%M"),
+        "sunset": datetime.fromtimestamp(data['sys']['sunset']).strftime("%H:%M")
+    }
+
+
+def daily_rollup(data, days=5):
+    """Per-day aggregates of the 3-hour series, bucketed by the city's local date
+
+    Items arrive in time order, so each day is a contiguous run reduced with reduceat.
+    """
+    items = data['list']
+    if not items:
+        return []
+    dt = np.array([item['dt'] for item in items], dtype=np.int64)
+    temperature = np.array([item['main']['temp'] for item in items], dtype=float)
+    humidity = np.array([item['main']['humidity'] for item in items], dtype=float)
+    wind_speed = np.array([item['wind']['speed'] for item in items], dtype=float) * 3.6
+    precipitation = np.array(
+        [item.get('rain', {}).get('3h', 0) + item.get('snow', {}).get('3h', 0) for item in items],
+        dtype=float
+    )
+
+    # The API reports the city's UTC offset in seconds; days split at local midnight
+    local_day = (dt + data['city'].get('timezone', 0)) // 86400
+    day_numbers, starts, counts = np.unique(local_day, return_index=True, return_counts=True)
+    day_index = np.repeat(np.arange(len(day_numbers)), counts)
+
+    # Most common description per day; ties go to the alphabetically first one
+    descriptions, codes = np.unique([item['weather'][0]['description'] for item in items],
+                                    return_inverse=True)
+    tally = np.zeros((len(day_numbers), len(descriptions)), dtype=np.int64)
+    np.add.at(tally, (day_index, codes), 1)
+
+    return [
+        {
+            "date": EPOCH + timedelta(days=int(day_numbers[i])),
+            "high_temperature": high,
+            "low_temperature": low,
+            "humidity": mean_humidity,
+            "wind_speed": mean_wind,
+            "precipitation": total_precipitation,
+            "description": str(descriptions[top]),
+        }
+        for i, (high, low, mean_humidity, mean_wind, total_precipitation, top) in enumerate(zip(
+            np.maximum.reduceat(temperature, starts),
+            np.minimum.reduceat(temperature, starts),
+            np.add.reduceat(humidity, starts) / counts,
+            np.add.reduceat(wind_speed, starts) / counts,
+            np.add.reduceat(precipitation, starts),
+            tally.argmax(axis=1),
+        ))
+    ][:days]
+
+
+def format_forecast(data):
+    """API payload for /weather/forecast from an OpenWeatherMap 5-day/3-hour response"""
+    forecast = []
+    for day in daily_rollup(data):
+        icon = WEATHER_ICONS.get(day["description"].split()[0].lower(), "🌤️")
+        forecast.append({
+            "date": day["date"].strftime("%Y-%m-%d"),
+            "day": day["date"].strftime("%A"),
+            "high_temperature": round(day["high_temperature"]),
+            "low_temperature": round(day["low_temperature"]),
+            "description": day["description"].title(),
+            "icon": icon,
+            "humidity": round(day["humidity"]),
+            "wind_speed": round(day["wind_speed"], 1),
+            "precipitation_chance": min(100, round(day["precipitation"] * 10))
+        })
+
+    return {
+        "location": f"{data['city']['name']}, {data['city']['country']}",
+        "forecast": forecast,
+        "utc_offset_seconds": data['city'].get('timezone', 0),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def forecast_ttl(data, now=None):
+    """Seconds until the next 3-hourly forecast issuance, at least WEATHER_FORECAST_MIN_TTL"""
+    items = data.get('list') or []
+    if not items:
+        return WEATHER_FORECAST_TTL
+    now = time.time() if now is None else now
+    # The first slot is the upcoming one; once it passes the API shifts the series
+    remaining = (items[0]['dt'] - now) % FORECAST_STEP_SECONDS
+    return int(max(remaining, WEATHER_FORECAST_MIN_TTL))
+
+
+# kind -> (upstream URL, formatter, TTL for found locations: seconds or a function of the payload)
+ENDPOINTS = {
+    "current": (CURRENT_URL, format_current, WEATHER_CURRENT_TTL),
+    "forecast": (FORECAST_URL, format_forecast, forecast_ttl),
+}
+
+
+class WeatherService:
+    """OpenWeatherMap lookups behind a TTL cache that also remembers unknown locations
+
+    Once started, a background loop keeps the hot set fresh ahead of expiry so those
+    lookups are served from cache, within an upstream budget per minute.
+    """
+
+    def __init__(self, http, cache=None, not_found_ttl=WEATHER_NOT_FOUND_TTL,
+                 hot_locations=WEATHER_HOT_LOCATIONS, hot_extra=WEATHER_HOT_EXTRA,
+                 refresh_budget=WEATHER_REFRESH_BUDGET, refresh_ahead=WEATHER_REFRESH_AHEAD,
+                 refresh_interval=WEATHER_REFRESH_INTERVAL, stale_grace=WEATHER_STALE_GRACE):
+        self.http = http
+        self.cache = cache if cache is not None else TTLCache()
+        self.not_found_ttl = not_found_ttl
+        self.hot_extra = hot_extra
+        self.refresh_budget = refresh_budget
+        self.refresh_ahead = refresh_ahead
+        self.refresh_interval = refresh_interval
+        self.stale_grace = stale_grace
+        # Concurrent misses and refreshes of the same location share one upstream call
+        self._flights = SingleFlight()
+        self._seeds = {("current", normalize_location(location)): location for location in hot_locations}
+        self._hot = dict(self._seeds)
+        # cache key -> [decayed request count, location as first asked for]
+        self._demand = {}
+        self._refreshing = set()
+        self._tasks = set()
+        self._loop_task = None
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._stats = {"upstream_calls": 0, "upstream_errors": 0, "batches": 0}
+        self._refresh_stats = {"cycles": 0, "refreshed": 0, "failures": 0, "deferred": 0, "stale_served": 0}
+
+    async def current(self, location):
+        return await self._lookup("current", location)
+
+    async def forecast(self, location):
+        return await self._lookup("forecast", location)
+
+    async def _lookup(self, kind, location):
+        key = api_key()
+        if key is None:
+            return dict(NOT_CONFIGURED)
+
+        cache_key = (kind, normalize_location(location))
+        self._track(cache_key, location)
+        hot = self._loop_task is not None and cache_key in self._hot
+        cached = self.cache.get(cache_key, grace=self.stale_grace if hot else 0)
+        if cached is not None:
+            value, age, expires_in = cached
+            stale = expires_in <= 0
+            if stale:
+                self._refresh_stats["stale_served"] += 1
+            if hot and expires_in <= self.refresh_ahead and "error" not in value:
+                # Serve what we have now; the refresh lands in the cache for the next caller
+                self._schedule_refresh(cache_key, location)
+            return dict(value, cache={"hit": True, "age_seconds": round(age, 1), "stale": stale})
+
+        value = await self._flights.run(cache_key, lambda: self._fetch(kind, location, key, cache_key))
+        return dict(value, cache={"hit": False, "age_seconds": 0})
+
+    async def _fetch(self, kind, location, key, cache_key):
+        """Call the API and cache the answer; errors are returned but not cached"""
+        url, formatter, ttl = ENDPOINTS[kind]
+        self._stats["upstream_calls"] += 1
+        try:
+            # Timeouts and connection reuse come from the shared pooled client
+            response = await self.http.get(url, params={"q": location, "appid": key, "units": "metric"})
+        except httpx.TransportError as e:
+            # Timeouts and refused connections are not cached; the next request tries again
+            self._stats["upstream_errors"] += 1
+            logger.warning(f"Weather upstream unreachable for {kind} '{location}': {type(e).__name__}")
+            return dict(UNAVAILABLE)
+
+        if response.status_code == 200:
+            data = response.json()
+            value = formatter(data)
+            self.cache.set(cache_key, value, ttl(data) if callable(ttl) else ttl)
+        elif response.status_code == 404:
+            # Misspelled places are asked for repeatedly; remember the miss briefly
+            value = dict(NOT_FOUND)
+            self.cache.set(cache_key, value, self.not_found_ttl)
+        else:
+            # Auth, quota and server errors say nothing about the location; not cached
+            self._stats["upstream_errors"] += 1
+            logger.warning(f"Weather upstream returned {response.status_code} for {kind} '{location}'")
+            return dict(UNAVAILABLE)
+        return value
+
+    def _track(self, cache_key, location):
+        # Demand only feeds the refresher, and is capped like the cache it keeps warm
+        if self._loop_task is None:
+            return
+        entry = self._demand.get(cache_key)
+        if entry is not None:
+            entry[0] += 1
+            return
+        if len(self._demand) >= self.cache.max_entries:
+            coldest = min(self._demand, key=lambda key: self._demand[key][0])
+            del self._demand[coldest]
+        self._demand[cache_key] = [1.0, location]
+
+    def _update_hot_set(self):
+        """Seeds plus the most-requested other locations; request counts decay each cycle"""
+        for cache_key in list(self._demand):
+            entry = self._demand[cache_key]
+            entry[0] *= 0.9
+            if entry[0] < 0.5:
+                del self._demand[cache_key]
+        ranked = sorted(
+            (item for item in self._demand.items() if item[0] not in self._seeds),
+            key=lambda item: item[1][0], reverse=True
+        )
+        self._hot = dict(self._seeds)
+        for cache_key, (_, location) in ranked[:self.hot_extra]:
+            self._hot[cache_key] = location
+
+    def _take_budget(self):
+        """Spend one upstream call from this minute's refresh budget, if any is left"""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._window_used = 0
+        if self._window_used >= self.refresh_budget:
+            return False
+        self._window_used += 1
+        return True
+
+    async def _refresh(self, cache_key, location):
+        key = api_key()
+        if key is None:
+            return
+        started = time.time()
+        try:
+            await self._flights.run(cache_key, lambda: self._fetch(cache_key[0], location, key, cache_key))
+            # Upstream errors are not cached, so a successful refresh shows up as a newly stored entry
+            entry = self.cache.peek(cache_key)
+            if entry is not None and entry[1] >= started:
+                self._refresh_stats["refreshed"] += 1
+            else:
+                self._refresh_stats["failures"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The cached answer stays in place until it expires
+            self._refresh_stats["failures"] += 1
+            logger.error(f"Weather refresh for '{location}' failed: {e}")
+        finally:
+            self._refreshing.discard(cache_key)
+
+    def _schedule_refresh(self, cache_key, location):
+        if cache_key in self._refreshing or self._loop_task is None:
+            return
+        if not self._take_budget():
+            self._refresh_stats["deferred"] += 1
+            return
+        self._refreshing.add(cache_key)
+        task = asyncio.create_task(self._refresh(cache_key, location))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                self._update_hot_set()
+                if api_key() is not None:
+                    due = []
+                    now = time.time()
+                    for cache_key, location in self._hot.items():
+                        entry = self.cache.peek(cache_key)
+                        if entry is None:
+                            due.append((float("-inf"), cache_key, location))
+                        elif "error" not in entry[0] and entry[2] - now <= self.refresh_ahead:
+                            # "Not found" answers are left to expire rather than refetched
+                            due.append((entry[2] - now, cache_key, location))
+                    # Missing and soonest-expiring entries first, as far as the budget goes
+                    for _, cache_key, location in sorted(due, key=lambda item: item[0]):
+                        self._schedule_refresh(cache_key, location)
+                self._refresh_stats["cycles"] += 1
+            except Exception as e:
+                logger.error(f"Weather refresh cycle failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start keeping the hot set warm; a zero budget leaves refresh off"""
+        if self.refresh_budget > 0 and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+            logger.info(f"Weather refresher started for {len(self._seeds)} seed locations, "
+                        f"budget {self.refresh_budget}/min")
+
+    async def stop(self):
+        """Stop the refresh loop and any refreshes in flight"""
+        tasks = list(self._tasks)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        self._demand.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def batch(self, locations, kind="current", concurrency=WEATHER_BATCH_CONCURRENCY):
+        """Look up many locations at once; uncached ones are fetched concurrently, at most
+        concurrency at a time. Returns one result per distinct location, in request order.
+        """
+        unique = {}
+        for location in locations:
+            unique.setdefault(normalize_location(location), location)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(location):
+            async with semaphore:
+                try:
+                    return await self._lookup(kind, location)
+                except Exception as e:
+                    # One bad location does not fail the batch
+                    logger.error(f"Weather batch lookup for '{location}' failed: {e}")
+                    return {"error": "Weather lookup failed"}
+
+        values = await asyncio.gather(*(lookup(location) for location in unique.values()))
+        results = [dict(value, query=location) for location, value in zip(unique.values(), values)]
+        self._stats["batches"] += 1
+        return {
+            "kind": kind,
+            "results": results,
+            "count": len(results),
+            "errors": sum(1 for value in values if "error" in value),
+            "cache_hits": sum(1 for value in values if value.get("cache", {}).get("hit")),
+        }
+
+    def invalidate(self, location=None):
+        """Forget cached answers for one location (both kinds) or for all locations"""
+        if location is None:
+            return self.cache.invalidate()
+        normalized = normalize_location(location)
+        return self.cache.invalidate(lambda key: key[1] == normalized)
+
+    def stats(self):
+        return dict(
+            self._stats,
+            cache=self.cache.stats(),
+            http=self.http.stats() if hasattr(self.http, "stats") else None,
+            single_flight=self._flights.stats(),
+            refresh=dict(
+                self._refresh_stats,
+                running=self._loop_task is not None,
+                hot_set=sorted(f"{kind}:{location}" for (kind, _), location in self._hot.items()),
+                budget_per_minute=self.refresh_budget,
+                budget_used=self._window_used,
+                in_flight=len(self._refreshing),
+            ),
+            ttl_seconds={"current": WEATHER_CURRENT_TTL, "forecast_min": WEATHER_FORECAST_MIN_TTL,
+                         "forecast_max": FORECAST_STEP_SECONDS, "not_found": self.not_found_ttl},
+        )
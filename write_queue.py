@@ -0,0 +1,142 @@
+import os
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Group-commit thresholds: flush when a batch is this big or this old
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "50"))
+WRITE_FLUSH_MS = int(os.getenv("WRITE_FLUSH_MS", "50"))
+WRITE_QUEUE_MAX = int(os.getenv("WRITE_QUEUE_MAX", "10000"))
+
+_STOP = object()
+
+
+def _mark_retrieved(future):
+    # Failures are logged by the queue; don't warn if nobody awaited the result
+    if not future.cancelled():
+        future.exception()
+
+
+class WriteBehindQueue:
+    """Buffers inserts off the request path and writes them in group commits"""
+
+    def __init__(self, db, batch_size=WRITE_BATCH_SIZE, flush_ms=WRITE_FLUSH_MS,
+                 max_pending=WRITE_QUEUE_MAX):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+        }
+
+    def start(self):
+        """Start the background flusher (called from the app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far, then stop the flusher"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, query, params=()):
+        """Queue a write; returns a future resolving to its lastrowid once committed"""
+        if self._task is None:
+            raise RuntimeError("Write queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_mark_retrieved)
+        # Blocks only when max_pending writes are already waiting (backpressure)
+        await self._queue.put((query, params, future))
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+        # Anything that slipped in behind the stop marker still gets written
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            await self._commit(leftovers)
+
+    async def _commit(self, batch):
+        def write_batch(conn):
+            return [conn.execute(query, params).lastrowid for query, params, _ in batch]
+
+        try:
+            row_ids = await self.db.write(write_batch)
+            results = [(future, row_id, None) for (_, _, future), row_id in zip(batch, row_ids)]
+        except Exception as e:
+            # Retry one by one so a single bad row doesn't drop the whole batch
+            logger.error(f"Group commit of {len(batch)} writes failed, retrying individually: {e}")
+            results = []
+            for query, params, future in batch:
+                try:
+                    results.append((future, await self.db.execute(query, params), None))
+                except Exception as item_error:
+                    logger.error(f"Dropped queued write: {item_error}")
+                    results.append((future, None, item_error))
+
+        failed = sum(1 for _, _, error in results if error is not None)
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["written"] += len(batch) - failed
+            self._stats["failed"] += failed
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+
+        for future, row_id, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(row_id)
+
+    def stats(self):
+        """Queue depth and commit batch counters"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["queue_depth"] = self._queue.qsize()
+        processed = snapshot["written"] + snapshot["failed"]
+        snapshot["avg_batch_size"] = round(processed / snapshot["batches"], 2) if snapshot["batches"] else 0
+        snapshot["batch_size_limit"] = self.batch_size
+        snapshot["flush_interval_ms"] = self.flush_interval * 1000
+        return snapshot